@@ -10,8 +10,10 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 import calendar
-from config import get_spreadsheet
-from sheets_handler import load_master_schedule, load_config_courseline, load_config_syllabus
+from sheets_handler import load_all_sheets, load_virtual_schedule
+from schedule_conflicts import find_conflicts
+from schedule_view import build_schedule_store, build_time_grid, day_records, prepare_schedule_view, schedule_version
+from virtual_schedule import lessons_on
 
 # ============================================
 # Page Configuration
@@ -37,6 +39,40 @@ DIFFICULTY_COLORS = {
 # Use black text uniformly
 TEXT_COLOR = "#000000"
 
+# Shared calendar styles, sent once per page; the rendered views only carry class names
+CALENDAR_CSS = """
+<style>
+.sk-month { display: grid; grid-template-columns: repeat(7, minmax(0, 1fr)); gap: 8px; }
+.sk-month-head { text-align: center; font-weight: bold; padding: 10px; }
+.sk-month-day { height: 180px; border: 1px solid #dee2e6; padding: 8px; overflow-y: auto; }
+.sk-month-day.sk-empty { background-color: #f8f9fa; padding: 0; }
+.sk-day-number { font-weight: bold; margin-bottom: 8px; font-size: 16px; }
+.sk-month-card { color: TEXT_COLOR; padding: 6px; margin-bottom: 6px; border-radius: 4px; font-size: 14px; font-weight: 600; }
+.sk-week { display: grid; grid-template-columns: minmax(0, 1fr) repeat(7, minmax(0, 3fr)); gap: 8px; }
+.sk-week-head { font-weight: bold; text-align: center; font-size: 16px; padding: 10px; border: 1px solid #dee2e6; background-color: #f8f9fa; }
+.sk-week-time { font-weight: bold; text-align: center; font-size: 18px; padding: 10px; border: 1px solid #dee2e6; background-color: #f8f9fa; display: flex; align-items: center; justify-content: center; }
+.sk-week-cell { padding: 8px; border: 1px solid #dee2e6; background-color: white; overflow-y: auto; }
+.sk-week-card { color: TEXT_COLOR; padding: 8px; border-radius: 4px; margin-bottom: 6px; border-left: 4px solid rgba(0,0,0,0.3); }
+.sk-week-card-title { font-weight: 600; font-size: 14px; }
+.sk-week-card-teacher { font-size: 12px; margin-top: 4px; }
+.sk-week-card-book { font-size: 12px; }
+.sk-card { background-color: white; border-radius: 8px; padding: 24px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); border-left: 8px solid #CCCCCC; }
+.sk-margin-top { margin-top: 20px; }
+.sk-margin-bottom { margin-bottom: 20px; }
+.sk-card-heading { font-size: 20px; font-weight: bold; color: #495057; margin-bottom: 8px; }
+.sk-card-title { font-size: 28px; font-weight: bold; margin-bottom: 20px; color: #212529; }
+.sk-card-body { line-height: 2; font-size: 16px; }
+.sk-card-label { color: #6c757d; font-weight: 600; }
+DIFFICULTY_CSS
+</style>
+""".replace("TEXT_COLOR", TEXT_COLOR).replace("DIFFICULTY_CSS", "\n".join(
+    f".sk-lv{level} {{ background-color: {color}; }}\n.sk-border-lv{level} {{ border-left-color: {color}; }}"
+    for level, color in [(0, "#CCCCCC")] + list(DIFFICULTY_COLORS.items())
+))
+
+# Rendered calendar views kept in memory (least recently used are evicted)
+RENDER_CACHE_ENTRIES = 64
+
 # ============================================
 # Data Loading
 # ============================================
@@ -46,95 +82,117 @@ def load_schedule_data():
     Load schedule data from Google Sheets
     """
     try:
-        # Test connection
-        spreadsheet = get_spreadsheet()
-        if spreadsheet is None:
-            st.error("❌ Unable to connect to Google Sheets - Spreadsheet is None")
-            st.info("Please check: 1. Secrets configuration 2. Service Account permissions")
-            return pd.DataFrame(), []
+        # Load all worksheets in a single batched request
+        # (served from the local mirror when available, so no connection is opened here)
+        sheets = load_all_sheets()
         
-        st.success(f"✅ Successfully connected to: {spreadsheet.title}")
-        
-        # Load Master_Schedule
-        df_schedule = load_master_schedule()
+        if sheets is None:
+            st.error("❌ Unable to load data from Google Sheets")
+            st.info("Please check: 1. Secrets configuration 2. Service Account permissions")
+            return pd.DataFrame(), [], schedule_version(None)
         
-        if df_schedule is None:
-            st.error("❌ load_master_schedule() returned None")
-            return pd.DataFrame(), []
+        df_schedule = sheets['Master_Schedule']
         
         if len(df_schedule) == 0:
             st.warning("⚠️ Master_Schedule has no data, please add course lines first")
-            return pd.DataFrame(), []
+            return pd.DataFrame(), [], schedule_version(None)
         
-        original_count = len(df_schedule)
-        st.info(f"📊 Master_Schedule total {original_count} records")
+        st.info(f"📊 Master_Schedule total {len(df_schedule)} records")
         
-        # Remove duplicates (based on Slot_ID)
-        df_schedule = df_schedule.drop_duplicates(subset=['Slot_ID'], keep='first')
+        # Deduplicate, normalize dates, add difficulty and teacher names
+        df_schedule, classes, removed = prepare_schedule_view(
+            df_schedule,
+            sheets['Config_CourseLine'],
+            sheets['Config_Teacher']
+        )
         
-        if len(df_schedule) < original_count:
-            removed = original_count - len(df_schedule)
+        if removed > 0:
             st.warning(f"⚠️ Removed {removed} duplicate records (Slot_ID duplicates)")
         
-        # Ensure date format
-        df_schedule['Date'] = pd.to_datetime(df_schedule['Date'], errors='coerce')
-        df_schedule['Date'] = df_schedule['Date'].dt.strftime('%Y-%m-%d')
-        
-        # Load Config_CourseLine to get difficulty
-        df_courseline = load_config_courseline()
-        
-        if df_courseline is not None and len(df_courseline) > 0:
-            # Extract difficulty from Level_ID
-            df_schedule['Difficulty'] = df_schedule['Level_ID'].str.extract(r'(\d+)').astype(int)
-        else:
-            # Default difficulty
-            df_schedule['Difficulty'] = 3
-        
-        # Load Config_Teacher to get teacher names
-        from sheets_handler import load_config_teacher
-        df_teacher = load_config_teacher()
-        
-        if df_teacher is not None and len(df_teacher) > 0:
-            # Merge teacher names
-            df_schedule = df_schedule.merge(
-                df_teacher[['Teacher_ID', 'Teacher_Name']], 
-                on='Teacher_ID', 
-                how='left'
-            )
-            # Use Teacher_Name if available, otherwise use Teacher_ID
-            df_schedule['Teacher'] = df_schedule['Teacher_Name'].fillna(df_schedule['Teacher_ID'])
-        else:
-            # If no teacher data, use Teacher_ID
-            df_schedule['Teacher'] = df_schedule['Teacher_ID']
-        
-        # Load Config_Syllabus (for other purposes if needed)
-        df_syllabus = load_config_syllabus()
-        
-        # Note: SyllabusName is already in Master_Schedule, no merge needed
-        # Each row has its own SyllabusName based on the weekly sequence
-        
-        # Organize column names (only rename what needs to be changed)
-        if 'Book_Full_Name' in df_schedule.columns:
-            df_schedule = df_schedule.rename(columns={'Book_Full_Name': 'Book'})
-        
-        if 'Chapters' in df_schedule.columns:
-            df_schedule = df_schedule.rename(columns={'Chapters': 'Unit'})
-        
-        # Remove duplicate records (deduplicate by Slot_ID)
-        if 'Slot_ID' in df_schedule.columns:
-            df_schedule = df_schedule.drop_duplicates(subset=['Slot_ID'], keep='first')
-        
-        # Get course list (for filtering)
-        classes = df_schedule[['CourseLineID', 'CourseName', 'Teacher', 'Difficulty']].drop_duplicates().to_dict('records')
-        
-        return df_schedule, classes
+        return df_schedule, classes, schedule_version(df_schedule)
     
     except Exception as e:
         st.error(f"❌ Failed to load data: {str(e)}")
         st.error(f"Error type: {type(e).__name__}")
         import traceback
         st.code(traceback.format_exc())
-        return pd.DataFrame(), []
+        return pd.DataFrame(), [], schedule_version(None)
+
+@st.cache_data(ttl=60)
+def load_conflict_report():
+    """
+    Find teacher / classroom double bookings in Master_Schedule
+    """
+    df_schedule, _, _ = load_schedule_data()
+    return find_conflicts(df_schedule)
+
+def filter_schedule(df_schedule, selected_class, selected_teacher, selected_difficulty):
+    """Apply the sidebar class / teacher / difficulty filters"""
+    filtered_df = df_schedule
+    
+    if selected_class != 'All':
+        filtered_df = filtered_df[filtered_df['CourseName'] == selected_class]
+    
+    if selected_teacher != 'All':
+        filtered_df = filtered_df[filtered_df['Teacher'] == selected_teacher]
+    
+    if selected_difficulty != 'All':
+        difficulty_level = int(selected_difficulty.replace('LV', ''))
+        filtered_df = filtered_df[filtered_df['Difficulty'] == difficulty_level]
+    
+    return filtered_df
+
+@st.cache_resource(ttl=60, max_entries=32, show_spinner=False)
+def load_schedule_store(_df_schedule, data_version, selected_class, selected_teacher, selected_difficulty):
+    """
+    Filter the schedule and index it by date (see schedule_view.build_schedule_store)
+    Built once per data version and filter combination, shared read-only by all sessions
+    """
+    return build_schedule_store(filter_schedule(_df_schedule, selected_class, selected_teacher, selected_difficulty))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_last_lesson_dates(data_version):
+    """Last scheduled date ('YYYY-MM-DD') of every course line in Master_Schedule"""
+    sheets = load_all_sheets()
+    if sheets is None or 'CourseLineID' not in sheets['Master_Schedule'].columns:
+        return {}
+    
+    df_schedule = sheets['Master_Schedule']
+    dates = pd.to_datetime(df_schedule['Date'], errors='coerce')
+    last_dates = dates.groupby(df_schedule['CourseLineID'].astype(str).to_numpy()).max().dropna()
+    return last_dates.dt.strftime('%Y-%m-%d').to_dict()
+
+@st.cache_data(ttl=60, max_entries=64, show_spinner=False)
+def load_projected_lessons(data_version, selected_class, selected_teacher, selected_difficulty, date_str):
+    """
+    Lessons on date_str computed from Config_CourseLine by the virtual schedule (see virtual_schedule.lessons_on)
+    Master_Schedule rows override the computed lessons: a line is only projected after its last scheduled lesson,
+    and lines with no rows in Master_Schedule yet (not synced) are not projected
+    """
+    virtual = load_virtual_schedule()
+    sheets = load_all_sheets()
+    if virtual is None or sheets is None:
+        return []
+    
+    lessons = lessons_on(virtual, date_str)
+    last_lesson_dates = load_last_lesson_dates(data_version)
+    last_dates = lessons['CourseLineID'].astype(str).map(last_lesson_dates) if len(lessons) > 0 else pd.Series(dtype=object)
+    lessons = lessons[(last_dates.notna() & (last_dates < date_str)).to_numpy()]
+    if len(lessons) == 0:
+        return []
+    
+    lessons, _, _ = prepare_schedule_view(lessons, sheets['Config_CourseLine'], sheets['Config_Teacher'])
+    return filter_schedule(lessons, selected_class, selected_teacher, selected_difficulty).to_dict('records')
+
+@st.cache_data(ttl=60, max_entries=64, show_spinner=False)
+def load_week_grid(_store, store_key, week_start_str):
+    """
+    Cell contents and per-time-slot row counts for one week (see schedule_view.build_time_grid)
+    Cached per week, filter combination and data version (store_key)
+    """
+    week_start = datetime.strptime(week_start_str, '%Y-%m-%d')
+    week_dates = [(week_start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)]
+    return build_time_grid(_store, week_dates)
 
 # ============================================
 # Helper Functions
@@ -147,6 +205,248 @@ def get_month_calendar(year, month):
         cal.append([0] * 7)
     return cal
 
+# ============================================
+# Calendar Rendering
+# ============================================
+def difficulty_class(difficulty):
+    """CSS class suffix of a difficulty level ('lv0' = unknown, grey)"""
+    return f"lv{difficulty}" if difficulty in DIFFICULTY_COLORS else "lv0"
+
+def course_card_html(course, heading, spacing='margin-top'):
+    """Course detail card (shared by the Day view and the detail panels)"""
+    level = difficulty_class(course.get('Difficulty', 3))
+    
+    # Safely get syllabus name
+    syllabus_name = '-'
+    if 'SyllabusName' in course and pd.notna(course.get('SyllabusName')):
+        syllabus_name = str(course['SyllabusName'])
+    elif 'SyllabusID' in course and pd.notna(course.get('SyllabusID')):
+        syllabus_name = str(course['SyllabusID'])
+    
+    classroom = str(course.get('Classroom', '-'))
+    unit = str(course.get('Unit', '-'))
+    course_name = str(course.get('CourseName', '-'))
+    difficulty = str(course.get('Difficulty', '-'))
+    teacher = str(course.get('Teacher', '-'))
+    book = str(course.get('Book', '-'))
+    
+    return f"""
+<div class='sk-card sk-{spacing} sk-border-{level}'>
+    <div class='sk-card-heading'>{heading}</div>
+    <div class='sk-card-title'>{course_name}</div>
+    <div class='sk-card-body'>
+        <div><span class='sk-card-label'>Classroom:</span> {classroom}</div>
+        <div><span class='sk-card-label'>Difficulty:</span> LV{difficulty}</div>
+        <div><span class='sk-card-label'>Teacher:</span> {teacher}</div>
+        <div><span class='sk-card-label'>Book:</span> {book}</div>
+        <div><span class='sk-card-label'>Unit:</span> {unit}</div>
+        <div><span class='sk-card-label'>Syllabus:</span> {syllabus_name}</div>
+    </div>
+</div>
+"""
+
+def course_heading(course):
+    """Date, weekday and time line of a course detail card"""
+    return f"{course.get('Date', '-')} ({course.get('Weekday', '-')}) {course.get('Time', '-')}"
+
+def render_month(store, year, month):
+    """The whole 6 x 7 month grid as one HTML block, plus the courses shown (for the detail selector)"""
+    parts = ["<div class='sk-calendar sk-month'>"]
+    parts += [f"<div class='sk-month-head'>{weekday}</div>" for weekday in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']]
+    courses = []
+    
+    for week in get_month_calendar(year, month):
+        for day in week:
+            if day == 0:
+                parts.append("<div class='sk-month-day sk-empty'></div>")
+                continue
+            
+            date_str = f"{year}-{month:02d}-{day:02d}"
+            parts.append(f"<div class='sk-month-day'><div class='sk-day-number'>{day}</div>")
+            for row in day_records(store, date_str):
+                classroom = row.get('Classroom', '')
+                parts.append(f"<div class='sk-month-card sk-{difficulty_class(row['Difficulty'])}'>{row['Time']} {row['CourseName']} {classroom}</div>")
+                courses.append((f"{date_str} {row['Time']} - {row['CourseName']} {classroom}", row))
+            parts.append("</div>")
+    
+    parts.append("</div>")
+    return {'html': "".join(parts), 'courses': courses}
+
+def render_week(store, store_key, week_start_str):
+    """The whole week grid (time slots x 7 days) as one HTML block, plus the courses shown"""
+    week_start = datetime.strptime(week_start_str, '%Y-%m-%d')
+    week_dates = [week_start + timedelta(days=i) for i in range(7)]
+    
+    # Cell contents for the whole week from one (Date, Time) grouping
+    grid = load_week_grid(store, store_key, week_start_str)
+    if len(grid['times']) == 0:
+        return {'html': None, 'courses': []}
+    
+    parts = ["<div class='sk-calendar sk-week'>", "<div class='sk-week-head'>Time</div>"]
+    for date in week_dates:
+        weekday = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'][date.weekday()]
+        parts.append(f"<div class='sk-week-head'>{date.month}/{date.day}<br>{weekday}</div>")
+    
+    courses = []
+    for time_slot in grid['times']:
+        # Height from the busiest day of the time slot: base 60px + 70px per course
+        cell_height = max(100, 60 + grid['max_rows'][time_slot] * 70)
+        parts.append(f"<div class='sk-week-time' style='height: {cell_height}px;'>{time_slot}</div>")
+        
+        for date in week_dates:
+            date_str = date.strftime('%Y-%m-%d')
+            parts.append(f"<div class='sk-week-cell' style='height: {cell_height}px;'>")
+            for row in grid['cells'].get((date_str, time_slot), []):
+                classroom = row.get('Classroom', '')
+                parts.append(
+                    f"<div class='sk-week-card sk-{difficulty_class(row['Difficulty'])}'>"
+                    f"<div class='sk-week-card-title'>{row['CourseName']} {classroom}</div>"
+                    f"<div class='sk-week-card-teacher'>{row['Teacher']}</div>"
+                    f"<div class='sk-week-card-book'>{row.get('Book', '-')}</div>"
+                    "</div>"
+                )
+                courses.append((f"{date_str} {time_slot} - {row['CourseName']} {classroom}", row))
+            parts.append("</div>")
+    
+    parts.append("</div>")
+    return {'html': "".join(parts), 'courses': courses}
+
+def day_cards_html(records):
+    """Course cards of one day (in the given order) as one HTML block, None when empty"""
+    cards = [
+        course_card_html(row, f"Time: {row['Time']}", spacing='margin-bottom')
+        for row in records
+    ]
+    return "".join(cards) if cards else None
+
+def render_day(store, date_str):
+    """All course cards of one day (in time order) as one HTML block"""
+    return {'html': day_cards_html(day_records(store, date_str))}
+
+@st.cache_data(ttl=3600, max_entries=RENDER_CACHE_ENTRIES, show_spinner=False)
+def render_calendar(_store, store_key, view_mode, window):
+    """
+    Rendered HTML of one calendar view
+    window: 'YYYY-MM' (Month), week start 'YYYY-MM-DD' (Week) or date 'YYYY-MM-DD' (Day)
+    Keyed by view, window and store_key (data version + filters), least recently used entries are evicted,
+    so navigating back or picking a course detail reuses the HTML instead of rebuilding every card
+    """
+    if view_mode == "Month":
+        year, month = map(int, window.split('-'))
+        return render_month(_store, year, month)
+    if view_mode == "Week":
+        return render_week(_store, store_key, window)
+    return render_day(_store, window)
+
+# ============================================
+# Calendar Fragments
+# ============================================
+# The navigation bar + calendar and the course detail panel rerun on their own:
+# ◀ / ▶ only rebuild the calendar fragment, picking a course only rebuilds the detail panel
+def shift_current_date(view_mode, step):
+    """Move the calendar one month / week / day forward (step=1) or back (step=-1)"""
+    current_date = st.session_state.current_date
+    if view_mode == "Month":
+        # First day of the previous / next month
+        month_index = current_date.month - 1 + step
+        current_date = current_date.replace(year=current_date.year + month_index // 12, month=month_index % 12 + 1, day=1)
+    elif view_mode == "Week":
+        current_date = current_date + timedelta(days=7 * step)
+    else:
+        current_date = current_date + timedelta(days=step)
+    
+    st.session_state.current_date = current_date
+    # Keep the sidebar date picker in step (applied on its next render)
+    st.session_state.date_picker = current_date.date()
+
+@st.fragment
+def course_details(courses, selector_key):
+    """Course selection below the calendar and the selected course's card"""
+    if len(courses) == 0:
+        return
+    
+    st.markdown("---")
+    st.subheader("📋 View Course Details")
+    course_options = ['Select a course...'] + [c[0] for c in courses]
+    
+    selected_idx = st.selectbox(
+        "Choose course:",
+        range(len(course_options)),
+        format_func=lambda x: course_options[x],
+        key=selector_key
+    )
+    
+    if selected_idx > 0:
+        selected_course = courses[selected_idx - 1][1]
+        st.markdown(course_card_html(selected_course, course_heading(selected_course)), unsafe_allow_html=True)
+
+@st.fragment
+def calendar_view(store, store_key, view_mode):
+    """Title row with ◀ / ▶ navigation and the calendar for the current month / week / day"""
+    col_title1, col_title2, col_title3 = st.columns([1, 2, 1])
+    
+    with col_title1:
+        st.button("◀", key="prev_date", on_click=shift_current_date, args=(view_mode, -1))
+    
+    with col_title3:
+        st.button("▶", key="next_date", on_click=shift_current_date, args=(view_mode, 1))
+    
+    current_date = st.session_state.current_date
+    week_start = current_date - timedelta(days=current_date.weekday())
+    
+    with col_title2:
+        if view_mode == "Month":
+            st.title(f"📅 {current_date.year}-{current_date.month:02d}")
+        elif view_mode == "Week":
+            week_end = week_start + timedelta(days=6)
+            st.title(f"📅 {week_start.strftime('%Y/%m/%d')} - {week_end.strftime('%m/%d')}")
+        else:
+            weekday_names = ['Mon','Tue','Wed','Thu','Fri','Sat','Sun']
+            st.title(f"📅 {current_date.strftime('%Y-%m-%d')} ({weekday_names[current_date.weekday()]})")
+    
+    st.markdown("---")
+    
+    # Month View
+    if view_mode == "Month":
+        st.caption("💡 Month mode: Display with difficulty colors")
+        
+        rendered = render_calendar(store, store_key, "Month", f"{current_date.year}-{current_date.month:02d}")
+        st.markdown(rendered['html'], unsafe_allow_html=True)
+        
+        # Course selection below calendar
+        course_details(rendered['courses'], "month_course_selector")
+    
+    # Week View
+    elif view_mode == "Week":
+        st.caption("💡 Week mode: Display with difficulty colors")
+        
+        rendered = render_calendar(store, store_key, "Week", week_start.strftime('%Y-%m-%d'))
+        if rendered['html'] is None:
+            st.info("📭 No courses this week")
+        else:
+            st.markdown(rendered['html'], unsafe_allow_html=True)
+            
+            # Course selection below table
+            course_details(rendered['courses'], "week_course_selector")
+    
+    # Day View
+    else:
+        st.caption("💡 Day mode: Display complete course information")
+        
+        date_str = current_date.strftime('%Y-%m-%d')
+        rendered = render_calendar(store, store_key, "Day", date_str)
+        projected = load_projected_lessons(*store_key, date_str)
+        if rendered['html'] is None and not projected:
+            st.info("📭 No courses today")
+        
+        if rendered['html'] is not None:
+            st.markdown(rendered['html'], unsafe_allow_html=True)
+        
+        # Lines whose generated schedule ends before this day: lessons they continue with once extended
+        if projected:
+            st.caption("🔮 Projected from course line settings (not yet in Master_Schedule)")
+            st.markdown(day_cards_html(projected), unsafe_allow_html=True)
+
 # ============================================
 # Sidebar
 # ============================================
@@ -170,6 +470,8 @@ st.sidebar.subheader("🗓️ Date Selection")
 # Initialize session state
 if 'current_date' not in st.session_state:
     st.session_state.current_date = datetime.now()
+if 'date_picker' not in st.session_state:
+    st.session_state.date_picker = st.session_state.current_date.date()
 
 # Date picker (with on_change callback)
 def on_date_change():
@@ -178,13 +480,12 @@ def on_date_change():
 
 selected_date = st.sidebar.date_input(
     "Select Date",
-    value=st.session_state.current_date.date(),
     key="date_picker",
     on_change=on_date_change
 )
 
 # Load data
-df_schedule, classes = load_schedule_data()
+df_schedule, classes, data_version = load_schedule_data()
 
 # Filter conditions
 st.sidebar.markdown("---")
@@ -214,37 +515,130 @@ if st.sidebar.button("➕ Add Course Line", use_container_width=True, type="prim
 # Sync class data button (legacy feature, keep but make secondary)
 if st.sidebar.button("🔄 Sync All Course Lines", use_container_width=True):
     with st.spinner("Generating schedule..."):
-        from schedule_generator import generate_all_schedules
-        from sheets_handler import write_master_schedule, clear_cache
+        from config import SCHEDULE_WORKERS, STREAM_CHUNK_ROWS, STREAM_SYNC_MIN_ROWS
+        from schedule_generator import (
+            generate_all_schedules, courseline_fingerprints, find_changed_courselines,
+            estimate_schedule_rows, iter_schedule_chunks, schedule_run_id, active_extensions
+        )
+        from sheets_handler import (
+            sync_master_schedule, stream_master_schedule, clear_cache,
+            load_sync_state, save_sync_state, load_syllabus_index
+        )
         
-        # Load config files
-        df_courseline = load_config_courseline()
-        df_syllabus = load_config_syllabus()
+        # Load config files (single batched request)
+        sheets = load_all_sheets()
         
-        if df_courseline is None or df_syllabus is None:
+        if sheets is None:
             st.sidebar.error("❌ Unable to load config files")
-        elif len(df_courseline) == 0:
+        elif len(sheets['Config_CourseLine']) == 0:
             st.sidebar.warning("⚠️ Config_CourseLine has no data, please add course lines first")
-        elif len(df_syllabus) == 0:
+        elif len(sheets['Config_Syllabus']) == 0:
             st.sidebar.warning("⚠️ Config_Syllabus has no data")
         else:
-            # Generate schedule
-            schedule = generate_all_schedules(df_courseline, df_syllabus, weeks=12)
+            df_courseline = sheets['Config_CourseLine']
+            df_syllabus = sheets['Config_Syllabus']
+            df_existing = sheets['Master_Schedule']
+            
+            # Only regenerate course lines whose config or syllabus changed since the last sync
+            fingerprints = courseline_fingerprints(df_courseline, df_syllabus, weeks=12)
+            previous_fingerprints = load_sync_state('courseline_fingerprints')
             
-            if len(schedule) == 0:
-                st.sidebar.warning("⚠️ Unable to generate schedule, please check settings")
+            # Extensions recorded by Extend Schedule / the nightly job are regenerated with their line;
+            # a line whose config changed since it was extended goes back to the plain 12 weeks
+            extensions = active_extensions(load_sync_state('schedule_extensions'), fingerprints)
+            save_sync_state('schedule_extensions', extensions)
+            
+            if previous_fingerprints and 'CourseLineID' in df_existing.columns:
+                existing_ids = set(df_existing['CourseLineID'].astype(str))
+                changed, removed = find_changed_courselines(fingerprints, previous_fingerprints, existing_ids)
+                scope = set(changed) | set(removed)
+                changed_lines = df_courseline[df_courseline['CourseLineID'].astype(str).isin(changed)]
             else:
-                # Write to Google Sheets
-                success = write_master_schedule(schedule)
+                # No fingerprints from a previous sync, or Master_Schedule is empty / has no header: regenerate everything
+                scope = None
+                changed_lines = df_courseline
+            
+            if scope is not None and not scope:
+                st.sidebar.info("✅ All course lines are up to date")
+            elif scope is None and estimate_schedule_rows(df_courseline, weeks=12, extensions=extensions) >= STREAM_SYNC_MIN_ROWS:
+                # Large full sync: upload the schedule chunk by chunk as it is generated
+                # (an interrupted upload resumes on the next sync with the same inputs)
+                chunks = iter_schedule_chunks(
+                    df_courseline, df_syllabus, weeks=12,
+                    chunk_rows=STREAM_CHUNK_ROWS, syllabus_index=load_syllabus_index(), extensions=extensions
+                )
+                success = stream_master_schedule(chunks, schedule_run_id(fingerprints, extensions))
                 
                 if success:
-                    st.sidebar.success(f"✅ Successfully generated {len(schedule)} course records")
-                    # Clear cache and reload
+                    save_sync_state('courseline_fingerprints', fingerprints)
                     clear_cache()
                     st.rerun()
+            else:
+                # Generate schedule
+                schedule = generate_all_schedules(
+                    changed_lines, df_syllabus, weeks=12,
+                    workers=SCHEDULE_WORKERS, syllabus_index=load_syllabus_index(), extensions=extensions
+                )
+                
+                if len(schedule) == 0 and scope is None:
+                    st.sidebar.warning("⚠️ Unable to generate schedule, please check settings")
+                else:
+                    # Validate: check the schedule as it will look after the sync for double bookings
+                    if scope is None:
+                        conflicts = find_conflicts(schedule)
+                    else:
+                        untouched = df_existing[~df_existing['CourseLineID'].astype(str).isin(scope)]
+                        conflicts = find_conflicts(
+                            pd.concat([untouched, schedule], ignore_index=True),
+                            involving=schedule['Slot_ID'] if len(schedule) > 0 else []
+                        )
+                    if len(conflicts) > 0:
+                        st.sidebar.warning(f"⚠️ {len(conflicts)} teacher / classroom double bookings, see the Scheduling Conflicts report")
+                    
+                    # Write only the changed rows to Google Sheets
+                    success = sync_master_schedule(schedule, scope=scope)
+                    
+                    if success:
+                        save_sync_state('courseline_fingerprints', fingerprints)
+                        st.sidebar.success(f"✅ Successfully generated {len(schedule)} course records")
+                        # Clear cache and reload
+                        clear_cache()
+                        st.rerun()
+                    else:
+                        # Next sync falls back to a full regeneration
+                        save_sync_state('courseline_fingerprints', {})
+
+extend_weeks = st.sidebar.number_input("Extend by (weeks)", min_value=1, max_value=52, value=4)
+if st.sidebar.button("⏩ Extend Schedule", use_container_width=True):
+    with st.spinner("Extending schedule..."):
+        from schedule_generator import extend_schedules, courseline_fingerprints, record_extensions
+        from sheets_handler import append_master_schedule, clear_cache, load_syllabus_index, load_sync_state, save_sync_state
+        
+        sheets = load_all_sheets()
+        
+        if sheets is None:
+            st.sidebar.error("❌ Unable to load config files")
+        else:
+            # Continue each active line after its last scheduled lesson (existing rows are not touched)
+            new_rows = extend_schedules(
+                sheets['Config_CourseLine'], sheets['Master_Schedule'], sheets['Config_Syllabus'],
+                weeks=int(extend_weeks), syllabus_index=load_syllabus_index()
+            )
+            
+            if len(new_rows) == 0:
+                st.sidebar.info("No scheduled course lines to extend")
+            elif append_master_schedule(new_rows):
+                # Record the new rows so later syncs regenerate them instead of trimming the line back to 12 weeks
+                fingerprints = courseline_fingerprints(sheets['Config_CourseLine'], sheets['Config_Syllabus'], weeks=12)
+                save_sync_state('schedule_extensions', record_extensions(
+                    load_sync_state('schedule_extensions'), sheets['Master_Schedule'], new_rows, fingerprints
+                ))
+                clear_cache()
+                st.rerun()
 
 if st.sidebar.button("🔄 Reload Data", use_container_width=True):
-    st.cache_data.clear()
+    from sheets_handler import clear_cache
+    clear_cache()
     st.rerun()
 
 # Display create course line dialog
@@ -268,368 +662,31 @@ st.sidebar.markdown("---")
 # ============================================
 # Apply Filters
 # ============================================
-filtered_df = df_schedule.copy()
-
-if selected_class != 'All':
-    filtered_df = filtered_df[filtered_df['CourseName'] == selected_class]
-
-if selected_teacher != 'All':
-    filtered_df = filtered_df[filtered_df['Teacher'] == selected_teacher]
-
-if selected_difficulty != 'All':
-    difficulty_level = int(selected_difficulty.replace('LV', ''))
-    filtered_df = filtered_df[filtered_df['Difficulty'] == difficulty_level]
+# Grouped by date once per data version / filter combination; views read per-day slices
+store_key = (data_version, selected_class, selected_teacher, selected_difficulty)
+store = load_schedule_store(df_schedule, *store_key)
 
 # ============================================
 # Main Display
 # ============================================
 
+# Double-booking report (whole schedule, not affected by filters)
+if not df_schedule.empty:
+    conflicts = load_conflict_report()
+    if len(conflicts) > 0:
+        with st.expander(f"⚠️ Scheduling Conflicts ({len(conflicts)})"):
+            st.dataframe(conflicts, width='stretch', hide_index=True)
+
 # If no data, show prompt
 if df_schedule.empty:
     st.info("🔭 Currently no course data, please click '➕ Add Course Line' on the left to start scheduling")
     st.stop()
 
-# Title row
-col_title1, col_title2, col_title3 = st.columns([1, 2, 1])
+# Calendar styles shared by all views and detail cards
+st.markdown(CALENDAR_CSS, unsafe_allow_html=True)
 
-with col_title1:
-    if st.button("◀", key="prev_date"):
-        if view_mode == "Month":
-            # Previous month
-            if st.session_state.current_date.month == 1:
-                st.session_state.current_date = st.session_state.current_date.replace(
-                    year=st.session_state.current_date.year - 1, 
-                    month=12, 
-                    day=1
-                )
-            else:
-                st.session_state.current_date = st.session_state.current_date.replace(
-                    month=st.session_state.current_date.month - 1, 
-                    day=1
-                )
-        elif view_mode == "Week":
-            # Previous week
-            st.session_state.current_date = st.session_state.current_date - timedelta(days=7)
-        else:
-            # Yesterday
-            st.session_state.current_date = st.session_state.current_date - timedelta(days=1)
-        st.rerun()
-
-with col_title2:
-    current_date = st.session_state.current_date
-    if view_mode == "Month":
-        st.title(f"📅 {current_date.year}-{current_date.month:02d}")
-    elif view_mode == "Week":
-        week_start = current_date - timedelta(days=current_date.weekday())
-        week_end = week_start + timedelta(days=6)
-        st.title(f"📅 {week_start.strftime('%Y/%m/%d')} - {week_end.strftime('%m/%d')}")
-    else:
-        weekday_names = ['Mon','Tue','Wed','Thu','Fri','Sat','Sun']
-        st.title(f"📅 {current_date.strftime('%Y-%m-%d')} ({weekday_names[current_date.weekday()]})")
-
-with col_title3:
-    if st.button("▶", key="next_date"):
-        if view_mode == "Month":
-            # Next month
-            if st.session_state.current_date.month == 12:
-                st.session_state.current_date = st.session_state.current_date.replace(
-                    year=st.session_state.current_date.year + 1, 
-                    month=1, 
-                    day=1
-                )
-            else:
-                st.session_state.current_date = st.session_state.current_date.replace(
-                    month=st.session_state.current_date.month + 1, 
-                    day=1
-                )
-        elif view_mode == "Week":
-            # Next week
-            st.session_state.current_date = st.session_state.current_date + timedelta(days=7)
-        else:
-            # Tomorrow
-            st.session_state.current_date = st.session_state.current_date + timedelta(days=1)
-        st.rerun()
-
-st.markdown("---")
-
-# ============================================
-# Month View
-# ============================================
-if view_mode == "Month":
-    st.caption("💡 Month mode: Display with difficulty colors")
-    
-    current_date = st.session_state.current_date
-    cal = get_month_calendar(current_date.year, current_date.month)
-    
-    header_cols = st.columns(7)
-    weekdays = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    for i, col in enumerate(header_cols):
-        col.markdown(f"<div style='text-align: center; font-weight: bold; padding: 10px;'>{weekdays[i]}</div>", unsafe_allow_html=True)
-    
-    # Collect all courses in current month for selection
-    month_courses = []
-    
-    for week in cal:
-        cols = st.columns(7)
-        for i, day in enumerate(week):
-            with cols[i]:
-                if day == 0:
-                    st.markdown("<div style='height: 180px; background-color: #f8f9fa; border: 1px solid #dee2e6;'></div>", unsafe_allow_html=True)
-                else:
-                    date_str = f"{current_date.year}-{current_date.month:02d}-{day:02d}"
-                    day_classes = filtered_df[filtered_df['Date'] == date_str]
-                    
-                    # Build cell HTML with colors
-                    cards_html = ""
-                    if len(day_classes) > 0:
-                        for idx, row in day_classes.iterrows():
-                            color = DIFFICULTY_COLORS.get(row['Difficulty'], "#CCCCCC")
-                            classroom = row.get('Classroom', '')
-                            cards_html += f"<div style='background-color: {color}; color: {TEXT_COLOR}; padding: 6px; margin-bottom: 6px; border-radius: 4px; font-size: 14px; font-weight: 600;'>{row['Time']} {row['CourseName']} {classroom}</div>"
-                            # Add to selection list
-                            month_courses.append((f"{date_str} {row['Time']} - {row['CourseName']} {classroom}", row.to_dict()))
-                    
-                    # Complete cell HTML
-                    cell_html = f"<div style='height: 180px; border: 1px solid #dee2e6; padding: 8px; overflow-y: auto;'><div style='font-weight: bold; margin-bottom: 8px; font-size: 16px;'>{day}</div>{cards_html}</div>"
-                    st.markdown(cell_html, unsafe_allow_html=True)
-    
-    # Course selection below calendar
-    if len(month_courses) > 0:
-        st.markdown("---")
-        st.subheader("📋 View Course Details")
-        course_options = ['Select a course...'] + [c[0] for c in month_courses]
-        
-        selected_idx = st.selectbox(
-            "Choose course:",
-            range(len(course_options)),
-            format_func=lambda x: course_options[x],
-            key="month_course_selector"
-        )
-        
-        if selected_idx > 0:
-            selected_course = month_courses[selected_idx - 1][1]
-            
-            # Display course details
-            color = DIFFICULTY_COLORS.get(selected_course.get('Difficulty', 3), "#CCCCCC")
-            
-            # Safely get syllabus name
-            syllabus_name = '-'
-            if 'SyllabusName' in selected_course and pd.notna(selected_course.get('SyllabusName')):
-                syllabus_name = str(selected_course['SyllabusName'])
-            elif 'SyllabusID' in selected_course and pd.notna(selected_course.get('SyllabusID')):
-                syllabus_name = str(selected_course['SyllabusID'])
-            
-            classroom = str(selected_course.get('Classroom', '-'))
-            unit = str(selected_course.get('Unit', '-'))
-            course_name = str(selected_course.get('CourseName', '-'))
-            time = str(selected_course.get('Time', '-'))
-            difficulty = str(selected_course.get('Difficulty', '-'))
-            teacher = str(selected_course.get('Teacher', '-'))
-            book = str(selected_course.get('Book', '-'))
-            date = str(selected_course.get('Date', '-'))
-            weekday = str(selected_course.get('Weekday', '-'))
-            
-            # Course detail card
-            card_html = f"""
-<div style='background-color: white; border-radius: 8px; padding: 24px; margin-top: 20px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); border-left: 8px solid {color};'>
-    <div style='font-size: 20px; font-weight: bold; color: #495057; margin-bottom: 8px;'>{date} ({weekday}) {time}</div>
-    <div style='font-size: 28px; font-weight: bold; margin-bottom: 20px; color: #212529;'>{course_name}</div>
-    <div style='line-height: 2; font-size: 16px;'>
-        <div><span style='color: #6c757d; font-weight: 600;'>Classroom:</span> {classroom}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Difficulty:</span> LV{difficulty}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Teacher:</span> {teacher}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Book:</span> {book}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Unit:</span> {unit}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Syllabus:</span> {syllabus_name}</div>
-    </div>
-</div>
-"""
-            st.markdown(card_html, unsafe_allow_html=True)
-
-# ============================================
-# Week View
-# ============================================
-elif view_mode == "Week":
-    st.caption("💡 Week mode: Display with difficulty colors")
-    
-    current_date = st.session_state.current_date
-    week_start = current_date - timedelta(days=current_date.weekday())
-    week_dates = [week_start + timedelta(days=i) for i in range(7)]
-    
-    # Get time slots
-    all_times = filtered_df['Time'].unique()
-    time_slots = sorted([t for t in all_times if pd.notna(t)])
-    
-    # Collect all courses in current week for selection
-    week_courses = []
-    
-    if len(time_slots) == 0:
-        st.info("📭 No courses this week")
-    else:
-        # Calculate max courses per time slot for consistent height
-        time_slot_heights = {}
-        for time_slot in time_slots:
-            max_courses = 0
-            for date in week_dates:
-                date_str = date.strftime('%Y-%m-%d')
-                count = len(filtered_df[
-                    (filtered_df['Date'] == date_str) & 
-                    (filtered_df['Time'] == time_slot)
-                ])
-                max_courses = max(max_courses, count)
-            # Calculate height: base 60px + 70px per course
-            time_slot_heights[time_slot] = max(100, 60 + max_courses * 70)
-        
-        # Table header
-        cols_header = st.columns([1] + [3]*7)
-        with cols_header[0]:
-            st.markdown("<div style='font-weight: bold; text-align: center; font-size: 16px; padding: 10px; border: 1px solid #dee2e6; background-color: #f8f9fa;'>Time</div>", unsafe_allow_html=True)
-        for i, date in enumerate(week_dates):
-            weekday = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'][date.weekday()]
-            with cols_header[i+1]:
-                st.markdown(f"<div style='font-weight: bold; text-align: center; font-size: 16px; padding: 10px; border: 1px solid #dee2e6; background-color: #f8f9fa;'>{date.month}/{date.day}<br>{weekday}</div>", unsafe_allow_html=True)
-        
-        # Rows for each time slot
-        for time_slot in time_slots:
-            cols = st.columns([1] + [3]*7)
-            cell_height = time_slot_heights[time_slot]
-            
-            # Time label
-            with cols[0]:
-                st.markdown(f"<div style='font-weight: bold; text-align: center; font-size: 18px; padding: 10px; height: {cell_height}px; border: 1px solid #dee2e6; background-color: #f8f9fa; display: flex; align-items: center; justify-content: center;'>{time_slot}</div>", unsafe_allow_html=True)
-            
-            # Courses for each day
-            for i, date in enumerate(week_dates):
-                date_str = date.strftime('%Y-%m-%d')
-                
-                slot_classes = filtered_df[
-                    (filtered_df['Date'] == date_str) & 
-                    (filtered_df['Time'] == time_slot)
-                ]
-                
-                with cols[i+1]:
-                    # Build cell with consistent height
-                    cell_content = f"<div style='height: {cell_height}px; padding: 8px; border: 1px solid #dee2e6; background-color: white; overflow-y: auto;'>"
-                    
-                    if len(slot_classes) > 0:
-                        for idx, row in slot_classes.iterrows():
-                            color = DIFFICULTY_COLORS.get(row['Difficulty'], "#CCCCCC")
-                            classroom = row.get('Classroom', '')
-                            
-                            # FIX: Removed indentation from f-string to prevent Markdown code block interpretation
-                            card_html = f"<div style='background-color: {color}; color: {TEXT_COLOR}; padding: 8px; border-radius: 4px; margin-bottom: 6px; border-left: 4px solid rgba(0,0,0,0.3);'>"
-                            card_html += f"<div style='font-weight: 600; font-size: 14px;'>{row['CourseName']} {classroom}</div>"
-                            card_html += f"<div style='font-size: 12px; margin-top: 4px;'>{row['Teacher']}</div>"
-                            card_html += f"<div style='font-size: 12px;'>{row.get('Book', '-')}</div>"
-                            card_html += "</div>"
-                            
-                            cell_content += card_html
-                            
-                            # Add to selection list
-                            week_courses.append((f"{date_str} {time_slot} - {row['CourseName']} {classroom}", row.to_dict()))
-                    
-                    cell_content += "</div>"
-                    st.markdown(cell_content, unsafe_allow_html=True)
-        
-        # Course selection below table
-        if len(week_courses) > 0:
-            st.markdown("---")
-            st.subheader("📋 View Course Details")
-            course_options = ['Select a course...'] + [c[0] for c in week_courses]
-            
-            selected_idx = st.selectbox(
-                "Choose course:",
-                range(len(course_options)),
-                format_func=lambda x: course_options[x],
-                key="week_course_selector"
-            )
-            
-            if selected_idx > 0:
-                selected_course = week_courses[selected_idx - 1][1]
-                
-                # Display course details
-                color = DIFFICULTY_COLORS.get(selected_course.get('Difficulty', 3), "#CCCCCC")
-                
-                # Safely get syllabus name
-                syllabus_name = '-'
-                if 'SyllabusName' in selected_course and pd.notna(selected_course.get('SyllabusName')):
-                    syllabus_name = str(selected_course['SyllabusName'])
-                elif 'SyllabusID' in selected_course and pd.notna(selected_course.get('SyllabusID')):
-                    syllabus_name = str(selected_course['SyllabusID'])
-                
-                classroom = str(selected_course.get('Classroom', '-'))
-                unit = str(selected_course.get('Unit', '-'))
-                course_name = str(selected_course.get('CourseName', '-'))
-                time = str(selected_course.get('Time', '-'))
-                difficulty = str(selected_course.get('Difficulty', '-'))
-                teacher = str(selected_course.get('Teacher', '-'))
-                book = str(selected_course.get('Book', '-'))
-                date = str(selected_course.get('Date', '-'))
-                weekday = str(selected_course.get('Weekday', '-'))
-                
-                # Course detail card
-                card_html = f"""
-<div style='background-color: white; border-radius: 8px; padding: 24px; margin-top: 20px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); border-left: 8px solid {color};'>
-    <div style='font-size: 20px; font-weight: bold; color: #495057; margin-bottom: 8px;'>{date} ({weekday}) {time}</div>
-    <div style='font-size: 28px; font-weight: bold; margin-bottom: 20px; color: #212529;'>{course_name}</div>
-    <div style='line-height: 2; font-size: 16px;'>
-        <div><span style='color: #6c757d; font-weight: 600;'>Classroom:</span> {classroom}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Difficulty:</span> LV{difficulty}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Teacher:</span> {teacher}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Book:</span> {book}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Unit:</span> {unit}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Syllabus:</span> {syllabus_name}</div>
-    </div>
-</div>
-"""
-                st.markdown(card_html, unsafe_allow_html=True)
-
-# Day View
-# ============================================
-else:
-    st.caption("💡 Day mode: Display complete course information")
-    
-    current_date = st.session_state.current_date
-    date_str = current_date.strftime('%Y-%m-%d')
-    day_classes = filtered_df[filtered_df['Date'] == date_str].sort_values('Time')
-    
-    if len(day_classes) == 0:
-        st.info("📭 No courses today")
-    else:
-        for _, row in day_classes.iterrows():
-            color = DIFFICULTY_COLORS.get(row['Difficulty'], "#CCCCCC")
-            
-            # Safely get syllabus name
-            syllabus_name = '-'
-            if 'SyllabusName' in row.index and pd.notna(row['SyllabusName']):
-                syllabus_name = str(row['SyllabusName'])
-            elif 'SyllabusID' in row.index and pd.notna(row['SyllabusID']):
-                syllabus_name = str(row['SyllabusID'])
-            
-            classroom = str(row.get('Classroom', '-'))
-            unit = str(row.get('Unit', '-'))
-            course_name = str(row['CourseName'])
-            time = str(row['Time'])
-            difficulty = str(row['Difficulty'])
-            teacher = str(row['Teacher'])
-            book = str(row.get('Book', '-'))
-            
-            # Course card (simplified, no emojis)
-            card_html = f"""
-<div style='background-color: white; border-radius: 8px; padding: 24px; margin-bottom: 20px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); border-left: 8px solid {color};'>
-    <div style='font-size: 20px; font-weight: bold; color: #495057; margin-bottom: 8px;'>Time: {time}</div>
-    <div style='font-size: 28px; font-weight: bold; margin-bottom: 20px; color: #212529;'>{course_name}</div>
-    <div style='line-height: 2; font-size: 16px;'>
-        <div><span style='color: #6c757d; font-weight: 600;'>Classroom:</span> {classroom}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Difficulty:</span> LV{difficulty}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Teacher:</span> {teacher}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Book:</span> {book}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Unit:</span> {unit}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Syllabus:</span> {syllabus_name}</div>
-    </div>
-</div>
-"""
-            st.markdown(card_html, unsafe_allow_html=True)
+# Navigation, calendar and course details (rerun as fragments)
+calendar_view(store, store_key, view_mode)
 
 # ============================================
 # Course Detail Popup (for Month/Week View)
@@ -638,25 +695,6 @@ if st.session_state.get('show_course_detail', False):
     course = st.session_state.get('selected_course', {})
     
     if course:
-        color = DIFFICULTY_COLORS.get(course.get('Difficulty', 3), "#CCCCCC")
-        
-        # Safely get syllabus name
-        syllabus_name = '-'
-        if 'SyllabusName' in course and pd.notna(course.get('SyllabusName')):
-            syllabus_name = str(course['SyllabusName'])
-        elif 'SyllabusID' in course and pd.notna(course.get('SyllabusID')):
-            syllabus_name = str(course['SyllabusID'])
-        
-        classroom = str(course.get('Classroom', '-'))
-        unit = str(course.get('Unit', '-'))
-        course_name = str(course.get('CourseName', '-'))
-        time = str(course.get('Time', '-'))
-        difficulty = str(course.get('Difficulty', '-'))
-        teacher = str(course.get('Teacher', '-'))
-        book = str(course.get('Book', '-'))
-        date = str(course.get('Date', '-'))
-        weekday = str(course.get('Weekday', '-'))
-        
         # Modal dialog
         with st.container():
             st.markdown("---")
@@ -669,20 +707,7 @@ if st.session_state.get('show_course_detail', False):
                     st.rerun()
             
             # Course detail card
-            card_html = f"""
-<div style='background-color: white; border-radius: 8px; padding: 24px; margin-bottom: 20px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); border-left: 8px solid {color};'>
-    <div style='font-size: 20px; font-weight: bold; color: #495057; margin-bottom: 8px;'>{date} ({weekday}) {time}</div>
-    <div style='font-size: 28px; font-weight: bold; margin-bottom: 20px; color: #212529;'>{course_name}</div>
-    <div style='line-height: 2; font-size: 16px;'>
-        <div><span style='color: #6c757d; font-weight: 600;'>Classroom:</span> {classroom}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Difficulty:</span> LV{difficulty}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Teacher:</span> {teacher}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Book:</span> {book}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Unit:</span> {unit}</div>
-        <div><span style='color: #6c757d; font-weight: 600;'>Syllabus:</span> {syllabus_name}</div>
-    </div>
-</div>
-"""
+            card_html = course_card_html(course, course_heading(course), spacing='margin-bottom')
             st.markdown(card_html, unsafe_allow_html=True)
             
             st.markdown("---")
@@ -0,0 +1,153 @@
+"""
+老師與教室可用時段模組
+由 Config_CourseLine 建立每位老師、每間教室的占用位元矩陣：
+資源 × 時段（星期 + 時間）× 週，週的維度以 np.packbits 壓縮成位元組
+查詢「某星期某時間、從某日起 N 週誰有空」時，只需對位元矩陣做一次 AND
+"""
+
+import numpy as np
+import pandas as pd
+
+from classroom_allocator import classroom_name, first_free_index
+from schedule_generator import weekday_of
+
+# 矩陣涵蓋的週數（從最早的開課週起算）；之後的週視為與最後一週相同，之前的週視為有空
+AVAILABILITY_WEEKS = 156
+
+def week_start(dates):
+    """
+    日期所在週的星期一（datetime64[D]）
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    return dates - weekday_of(dates).astype('timedelta64[D]')
+
+def first_class_date(start_date, weekday):
+    """
+    start_date 當天或之後第一個星期 weekday（1-7）的日期
+    """
+    start_date = np.datetime64(pd.Timestamp(start_date).date(), 'D')
+    days_ahead = (int(weekday) - 1 - weekday_of(start_date)) % 7
+    return start_date + np.timedelta64(int(days_ahead), 'D')
+
+def build_busy_bits(resource_codes, slot_codes, start_weeks, resource_count, slot_count, weeks):
+    """
+    建立壓縮後的占用矩陣
+    進行中的課綱路線從第一次上課的那一週起持續占用該時段
+    返回 uint8 陣列，形狀為 (資源數, 時段數, ceil(週數 / 8))
+    """
+    first_busy = np.full((resource_count, slot_count), weeks, dtype=np.int64)
+    np.minimum.at(first_busy, (resource_codes, slot_codes), np.clip(start_weeks, 0, weeks))
+    busy = np.arange(weeks)[None, None, :] >= first_busy[:, :, None]
+    return np.packbits(busy, axis=2)
+
+def build_availability(df_courseline, df_teacher=None, weeks=AVAILABILITY_WEEKS):
+    """
+    建立老師與教室的可用時段索引
+
+    Parameters:
+    - df_courseline: Config_CourseLine（只計入「進行中」的路線）
+    - df_teacher: Config_Teacher，提供尚未排課的老師名單
+    - weeks: 矩陣涵蓋的週數
+
+    Returns:
+    - dict：
+        'origin': 第 0 週的星期一
+        'weeks': 週數
+        'slots': {(星期, 時間): 時段編號}
+        'teachers' / 'classrooms': {'ids': 資源 ID 陣列, 'busy': 占用位元矩陣}
+    """
+    active = df_courseline
+    if active is not None and len(active) > 0 and 'Status' in active.columns:
+        active = active[active['Status'] == '進行中']
+
+    # 已結束路線用過的教室也是現有教室
+    known_teachers = df_teacher['Teacher_ID'] if df_teacher is not None and 'Teacher_ID' in df_teacher.columns else []
+    known_classrooms = []
+    if df_courseline is not None and 'Classroom' in df_courseline.columns:
+        known_classrooms = df_courseline['Classroom'].dropna().astype(str).str.strip()
+        known_classrooms = known_classrooms[known_classrooms != '']
+
+    if active is None or len(active) == 0:
+        active = pd.DataFrame(columns=['Weekday', 'Time', 'Start_Date', 'Teacher_ID', 'Classroom'])
+
+    weekdays = pd.to_numeric(active['Weekday'], errors='coerce')
+    start_dates = pd.to_datetime(active['Start_Date'], errors='coerce', format='mixed')
+    valid = (weekdays.notna() & start_dates.notna()).to_numpy()
+    active = active[valid]
+    weekdays = weekdays[valid].astype(int).to_numpy()
+    start_dates = start_dates[valid].to_numpy().astype('datetime64[D]')
+
+    # 每個時段第一次上課的日期（與排課的規則相同）
+    days_ahead = (weekdays - 1 - weekday_of(start_dates)) % 7
+    first_dates = start_dates + days_ahead.astype('timedelta64[D]')
+
+    today = np.datetime64(pd.Timestamp.now().date(), 'D')
+    origin = week_start(first_dates.min() if len(first_dates) > 0 else today)
+    origin = min(origin, week_start(today))
+    start_weeks = ((first_dates - origin).astype(np.int64) // 7) if len(first_dates) > 0 else np.array([], dtype=np.int64)
+
+    times = active['Time'].astype(str).str.strip().to_numpy(dtype=object)
+    slot_codes, slot_labels = pd.factorize(pd.Series(list(zip(weekdays.tolist(), times)), dtype=object))
+    slots = {label: code for code, label in enumerate(slot_labels)}
+
+    availability = {'origin': origin, 'weeks': weeks, 'slots': slots}
+
+    for kind, column, known in (
+        ('teachers', 'Teacher_ID', known_teachers),
+        ('classrooms', 'Classroom', known_classrooms),
+    ):
+        if column in active.columns:
+            values = active[column].astype(str).str.strip().to_numpy(dtype=object)
+        else:
+            values = np.full(len(active), '', dtype=object)
+        assigned = values != ''
+        ids = pd.unique(pd.Series(list(map(str, known)) + list(values[assigned]), dtype=object))
+        id_codes = pd.Index(ids).get_indexer(values[assigned])
+
+        availability[kind] = {
+            'ids': np.asarray(ids, dtype=object),
+            'busy': build_busy_bits(id_codes, slot_codes[assigned], start_weeks[assigned], len(ids), len(slot_labels), weeks),
+        }
+
+    return availability
+
+def week_mask(availability, first_week, weeks):
+    """
+    查詢範圍的週遮罩（壓縮後）
+    第 0 週之前還沒有任何課程，這些週一律有空（不列入遮罩）；
+    矩陣範圍之後的週以最後一週代表
+    """
+    total = availability['weeks']
+    last_week = first_week + weeks
+    if first_week >= total:
+        first_week, last_week = total - 1, total
+
+    mask = np.zeros(total, dtype=bool)
+    mask[max(first_week, 0):min(max(last_week, 0), total)] = True
+    return np.packbits(mask)
+
+def free_resources(availability, weekday, time, start_date, weeks):
+    """
+    查詢某星期、某時間，從 start_date 起連續 weeks 週都有空的老師與教室
+
+    Returns:
+    - dict：{'teachers': [老師 ID], 'classrooms': [教室]}
+        沒有任何現有教室有空時，classrooms 會提供一間新教室的名稱
+    """
+    slot = availability['slots'].get((int(weekday), str(time).strip()))
+    first_week = int((first_class_date(start_date, weekday) - availability['origin']).astype(np.int64) // 7)
+    mask = week_mask(availability, first_week, weeks)
+
+    result = {}
+    for kind in ('teachers', 'classrooms'):
+        ids = availability[kind]['ids']
+        if slot is None:
+            free = np.ones(len(ids), dtype=bool)
+        else:
+            free = ~(availability[kind]['busy'][:, slot, :] & mask).any(axis=1)
+        result[kind] = ids[free].tolist()
+
+    if not result['classrooms']:
+        result['classrooms'] = [classroom_name(first_free_index(set(availability['classrooms']['ids'])))]
+
+    return result
@@ -0,0 +1,281 @@
+"""
+Scheduling Pipeline Benchmark
+Generates synthetic course lines, syllabi and teachers, then times each stage
+of the scheduling pipeline (syllabus index, full generation, per-line
+generation, Slot_ID hashing, conflict detection, calendar enrichment, virtual
+schedule queries).
+
+Each stage is run once for timing and once under tracemalloc for peak memory.
+Results are saved as JSON (with the git commit) so runs can be compared across commits.
+
+Usage:
+    python benchmark.py                              # 10k and 100k course lines
+    python benchmark.py --lines 1000 5000 --weeks 24
+    python benchmark.py --lines 50000 --workers 4    # also time process-pool generation
+    python benchmark.py --compare benchmark_results/<earlier run>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import LOCAL_SHEETS_SEED
+from schedule_conflicts import find_conflicts
+from schedule_generator import (
+    SLOT_ID_NAMESPACE, build_schedule_parallel, build_syllabus_index, generate_all_schedules,
+    generate_interleaved_schedule, make_slot_ids, prepare_courselines
+)
+from schedule_view import prepare_schedule_view
+from virtual_schedule import build_virtual_schedule, lessons_between
+
+RESULTS_DIR = "benchmark_results"
+TIMES = ['09:00', '10:30', '13:00', '14:30', '16:00', '17:30', '19:00']
+
+# ============================================
+# Synthetic Data
+# ============================================
+def synthetic_data(lines, seed=0):
+    """
+    Build Config_CourseLine / Config_Syllabus / Config_Teacher frames for `lines` course lines
+    Each line has 1-3 weekly slots; roughly 1 in 10 lines is finished
+    """
+    rng = np.random.default_rng(seed)
+    syllabus_count = max(20, lines // 100)
+    teacher_count = max(10, lines // 5)
+
+    # Config_Syllabus: 10-40 books per syllabus
+    book_counts = rng.integers(10, 41, syllabus_count)
+    syllabus_of_book = np.repeat(np.arange(syllabus_count), book_counts)
+    sequence = np.arange(len(syllabus_of_book)) - np.repeat(np.cumsum(book_counts) - book_counts, book_counts) + 1
+    df_syllabus = pd.DataFrame({
+        'SyllabusID': [f'SYL{i:04d}' for i in syllabus_of_book],
+        'SyllabusName': [f'Syllabus {i}' for i in syllabus_of_book],
+        'Level_ID': [f'Level_{i % 5 + 1}' for i in syllabus_of_book],
+        'Sequence': sequence,
+        'Book_Code': [f'B{i:04d}-{s:02d}' for i, s in zip(syllabus_of_book, sequence)],
+        'Book_Full_Name': [f'Book {i} vol.{s}' for i, s in zip(syllabus_of_book, sequence)],
+        'Unit': rng.choice(['1+2', '3+4', 'Review', '-'], len(syllabus_of_book)),
+    })
+
+    df_teacher = pd.DataFrame({
+        'Teacher_ID': [f'T{i:05d}' for i in range(teacher_count)],
+        'Teacher_Name': [f'Teacher {i}' for i in range(teacher_count)],
+    })
+
+    # Config_CourseLine: one row per weekly slot
+    slot_counts = rng.integers(1, 4, lines)
+    line_of_slot = np.repeat(np.arange(lines), slot_counts)
+    slots = len(line_of_slot)
+    line_syllabus = rng.integers(0, syllabus_count, lines)
+    line_teacher = rng.integers(0, teacher_count, lines)
+    line_status = np.where(rng.random(lines) < 0.9, '進行中', '結束')
+    line_start = np.datetime64('2025-01-06') + rng.integers(0, 365, lines).astype('timedelta64[D]')
+
+    df_courseline = pd.DataFrame({
+        'CourseLineID': [f'CL{i:06d}' for i in line_of_slot],
+        'CourseName': [f'Course {i}' for i in line_of_slot],
+        'SyllabusID': [f'SYL{line_syllabus[i]:04d}' for i in line_of_slot],
+        'Start_Sequence': rng.integers(1, 6, lines)[line_of_slot],
+        'Weekday': rng.integers(1, 8, slots),
+        'Time': rng.choice(TIMES, slots),
+        'Classroom': [f'R{i}' for i in rng.integers(0, max(5, lines // 20), slots)],
+        'Teacher_ID': [f'T{line_teacher[i]:05d}' for i in line_of_slot],
+        'Start_Date': pd.to_datetime(line_start[line_of_slot]).strftime('%Y-%m-%d'),
+        'Status': line_status[line_of_slot],
+        'Note': '',
+    })
+
+    return df_courseline, df_syllabus, df_teacher
+
+# ============================================
+# Measurement
+# ============================================
+def measure(fn, memory=True):
+    """
+    Run fn once for wall time and (optionally) once more under tracemalloc for peak memory
+    Returns (result, seconds, peak_mb)
+    """
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+    return result, seconds, peak_mb
+
+def per_row_slot_ids(courseline_ids, dates, times):
+    """
+    Reference Slot_IDs built with one uuid.uuid5 call per row (same values as make_slot_ids)
+    Timed next to make_slot_ids to track the gain of the bulk version
+    """
+    return [
+        str(uuid.uuid5(SLOT_ID_NAMESPACE, f"{courseline_id}|{date}|{time}"))
+        for courseline_id, date, time in zip(courseline_ids, dates, times)
+    ]
+
+def stage_result(seconds, peak_mb, rows):
+    return {
+        'seconds': round(seconds, 4),
+        'rows': int(rows),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_mb': round(peak_mb, 2) if peak_mb is not None else None,
+    }
+
+def run_pipeline(lines, weeks, sample_lines, memory=True, seed=0, workers=1):
+    """
+    Time every pipeline stage on `lines` synthetic course lines
+    With workers > 1, also time build_schedule_parallel directly (ignoring PARALLEL_MIN_CONFIGS)
+    so it can be compared with the serial generate_all_schedules stage
+    """
+    df_courseline, df_syllabus, df_teacher = synthetic_data(lines, seed)
+    stages = {}
+
+    index, seconds, peak = measure(lambda: build_syllabus_index(df_syllabus), memory)
+    stages['build_syllabus_index'] = stage_result(seconds, peak, len(df_syllabus))
+
+    schedule, seconds, peak = measure(
+        lambda: generate_all_schedules(df_courseline, df_syllabus, weeks, syllabus_index=index), memory
+    )
+    stages['generate_all_schedules'] = stage_result(seconds, peak, len(schedule))
+
+    if workers > 1:
+        configs, line_of_config = prepare_courselines(df_courseline)
+        parallel, seconds, peak = measure(
+            lambda: build_schedule_parallel(configs, line_of_config, index, weeks, workers), memory
+        )
+        stages['generate_all_schedules_parallel'] = stage_result(seconds, peak, len(parallel))
+        stages['generate_all_schedules_parallel']['workers'] = workers
+
+    slot_keys = (schedule['CourseLineID'].to_numpy(), schedule['Date'].to_numpy(), schedule['Time'].to_numpy())
+    _, seconds, peak = measure(lambda: make_slot_ids(*slot_keys), memory)
+    stages['make_slot_ids'] = stage_result(seconds, peak, len(schedule))
+    _, seconds, peak = measure(lambda: per_row_slot_ids(*slot_keys), memory)
+    stages['make_slot_ids_per_row'] = stage_result(seconds, peak, len(schedule))
+
+    # The course line form generates one line at a time: time a sample of lines
+    active = df_courseline[df_courseline['Status'] == '進行中']
+    sample_ids = active['CourseLineID'].drop_duplicates().head(sample_lines)
+    groups = [group.to_dict('records') for _, group in active[active['CourseLineID'].isin(sample_ids)].groupby('CourseLineID')]
+
+    def interleaved():
+        return sum(len(generate_interleaved_schedule(configs, df_syllabus, weeks, syllabus_index=index)) for configs in groups)
+
+    rows, seconds, peak = measure(interleaved, memory)
+    stages['generate_interleaved_schedule'] = stage_result(seconds, peak, rows)
+    stages['generate_interleaved_schedule']['lines'] = len(groups)
+
+    conflicts, seconds, peak = measure(lambda: find_conflicts(schedule), memory)
+    stages['find_conflicts'] = stage_result(seconds, peak, len(schedule))
+    stages['find_conflicts']['conflicts'] = len(conflicts)
+
+    # Calendar enrichment works on a fresh copy each run, as when read from the sheet
+    (view, classes, _), seconds, peak = measure(
+        lambda: prepare_schedule_view(schedule.copy(), df_courseline, df_teacher), memory
+    )
+    stages['prepare_schedule_view'] = stage_result(seconds, peak, len(view))
+    stages['prepare_schedule_view']['classes'] = len(classes)
+
+    virtual, seconds, peak = measure(lambda: build_virtual_schedule(df_courseline, index, weeks), memory)
+    stages['build_virtual_schedule'] = stage_result(seconds, peak, len(df_courseline))
+
+    first_date = schedule['Date'].min()
+    week_end = (pd.Timestamp(first_date) + pd.Timedelta(days=6)).strftime('%Y-%m-%d')
+    week, seconds, peak = measure(lambda: lessons_between(virtual, first_date, week_end), memory)
+    stages['virtual_week_query'] = stage_result(seconds, peak, len(week))
+
+    return {
+        'lines': lines,
+        'configs': len(df_courseline),
+        'weeks': weeks,
+        'schedule_rows': len(schedule),
+        'stages': stages,
+    }
+
+# ============================================
+# Results
+# ============================================
+def git_commit():
+    """
+    Current commit hash and whether the working tree has uncommitted changes
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def print_run(run, baseline=None):
+    print(f"\n{run['lines']} course lines, {run['configs']} slots, {run['weeks']} weeks -> {run['schedule_rows']} rows")
+    print(f"  {'stage':<32}{'seconds':>10}{'rows/sec':>14}{'peak MB':>10}{'vs base':>10}")
+    for name, stage in run['stages'].items():
+        ratio = ''
+        base = (baseline or {}).get('stages', {}).get(name)
+        if base and base['seconds']:
+            ratio = f"{stage['seconds'] / base['seconds']:.2f}x"
+        rate = f"{stage['rows_per_sec']:,.0f}" if stage['rows_per_sec'] else '-'
+        peak = f"{stage['peak_mb']:.1f}" if stage['peak_mb'] is not None else '-'
+        print(f"  {name:<32}{stage['seconds']:>10.3f}{rate:>14}{peak:>10}{ratio:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scheduling pipeline on synthetic data")
+    parser.add_argument('--lines', type=int, nargs='+', default=[10000, 100000], help="course line counts to benchmark")
+    parser.add_argument('--weeks', type=int, default=12, help="weeks generated per course line")
+    parser.add_argument('--sample-lines', type=int, default=500, help="lines timed one at a time with generate_interleaved_schedule")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--workers', type=int, default=1, help="also time process-pool generation with this many workers")
+    parser.add_argument('--output', help="result file (default: benchmark_results/<timestamp>_<commit>.json)")
+    parser.add_argument('--compare', help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = {run['lines']: run for run in json.load(f)['runs'] if run['weeks'] == args.weeks}
+
+    commit, dirty = git_commit()
+    results = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'local_sheets_seed': LOCAL_SHEETS_SEED,
+        'runs': [],
+    }
+
+    for lines in args.lines:
+        run = run_pipeline(lines, args.weeks, args.sample_lines, memory=not args.no_memory, seed=args.seed, workers=args.workers)
+        results['runs'].append(run)
+        print_run(run, baseline.get(lines))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{(commit or 'nocommit')[:10]}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
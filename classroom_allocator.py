@@ -0,0 +1,104 @@
+"""
+教室分配模組
+以 (星期, 時間) 為鍵建立教室占用索引，只計入「進行中」的課綱路線
+分配時取該時段第一個未被占用的教室（A, B, C ... Z, AA, AB ...），
+同一次分配中已給出的教室會記錄在索引中，不會重複分配
+"""
+
+import pandas as pd
+
+def classroom_name(index):
+    """
+    第 index 間教室的名稱（0 -> A, 25 -> Z, 26 -> AA）
+    """
+    name = ""
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+def slot_key(weekday, time):
+    """
+    占用索引的鍵：(星期 1-7, 時間字串)
+    """
+    return (int(weekday), str(time).strip())
+
+def build_occupancy(df_courseline):
+    """
+    建立教室占用索引
+    返回 dict：{(星期, 時間): 已使用的教室 set}
+    """
+    occupancy = {}
+    if df_courseline is None or len(df_courseline) == 0 or 'Classroom' not in df_courseline.columns:
+        return occupancy
+
+    # 已結束或暫停的課綱路線不占用教室
+    active = df_courseline
+    if 'Status' in active.columns:
+        active = active[active['Status'] == '進行中']
+
+    weekdays = pd.to_numeric(active['Weekday'], errors='coerce')
+    rooms = active['Classroom'].astype(str).str.strip()
+    valid = weekdays.notna() & active['Classroom'].notna() & (rooms != '')
+
+    slots = pd.DataFrame({
+        'Weekday': weekdays[valid].astype(int),
+        'Time': active['Time'][valid].astype(str).str.strip(),
+        'Classroom': rooms[valid],
+    })
+    for (weekday, time), used in slots.groupby(['Weekday', 'Time'])['Classroom']:
+        occupancy[(int(weekday), time)] = set(used)
+
+    return occupancy
+
+def first_free_index(used, start=0):
+    """
+    從第 start 間開始，找出第一間不在 used 中的教室編號
+    """
+    index = start
+    while classroom_name(index) in used:
+        index += 1
+    return index
+
+def allocate_classrooms(df_slots, occupancy=None):
+    """
+    一次為多個時段分配教室
+
+    Parameters:
+    - df_slots: 時段 DataFrame（需有 Weekday、Time，可有 Classroom）
+    - occupancy: 已存在的占用索引（build_occupancy），None 表示從空的索引開始
+        例如對整個 Config_CourseLine 重新分配時傳 None，新增時段時傳入現有課程的占用
+
+    已有教室且該時段未被占用的列保留原教室，其餘（空白或撞教室）分配空教室
+    返回與 df_slots 同索引的 Series
+    """
+    if occupancy is None:
+        occupancy = {}
+
+    keys = [slot_key(weekday, time) for weekday, time in zip(df_slots['Weekday'], df_slots['Time'])]
+    if 'Classroom' in df_slots.columns:
+        current = ['' if pd.isna(room) else str(room).strip() for room in df_slots['Classroom']]
+    else:
+        current = [''] * len(df_slots)
+
+    # 第一輪：保留不衝突的既有教室（避免被後面的列搶走）
+    assigned = [None] * len(df_slots)
+    for i, (key, room) in enumerate(zip(keys, current)):
+        used = occupancy.setdefault(key, set())
+        if room and room not in used:
+            used.add(room)
+            assigned[i] = room
+
+    # 第二輪：其餘的列依序分配空教室
+    # 索引只會增加，同一時段下一間空教室一定在上一次分配的之後，從該處繼續找
+    cursors = {}
+    for i, key in enumerate(keys):
+        if assigned[i] is None:
+            used = occupancy[key]
+            index = first_free_index(used, cursors.get(key, 0))
+            cursors[key] = index + 1
+            assigned[i] = classroom_name(index)
+            used.add(assigned[i])
+
+    return pd.Series(assigned, index=df_slots.index, name='Classroom')
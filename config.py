@@ -1,12 +1,24 @@
 """
 Google Sheets 連線設定模組
 負責初始化 gspread 客戶端
+
+連線（憑證、HTTP Session、Spreadsheet、工作表物件）以 st.cache_resource
+在整個程序內共用，跨 rerun 與使用者 session 重複使用，不再每次重新授權。
 """
 
+import os
+import threading
+
 import gspread
+import requests
+from google.auth.exceptions import RefreshError, TransportError
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
 import streamlit as st
 
+from local_sheets import open_local_spreadsheet
+
 # Google Sheets 設定
 SPREADSHEET_ID = "1gRZN5Xxlot5VINlDzYabBcuFoXrdgrb5ocENvtTFc8M"
 SCOPES = [
@@ -14,33 +26,125 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive"
 ]
 
+# 連線共用設定
+CONNECTION_TTL = 3600   # 共用連線最長存活秒數，到期後自動重建
+HTTP_POOL_SIZE = 10     # keep-alive 連線池大小（多位使用者同時操作時共用）
+
+# 請求排程設定（見 sheets_request.py）
+# Service Account 視為同一位使用者，所有 session 共用每分鐘配額
+READ_REQUESTS_PER_MINUTE = 60
+WRITE_REQUESTS_PER_MINUTE = 60
+REQUEST_MAX_RETRIES = 5       # 429 / 5xx 最多重試次數
+REQUEST_BACKOFF_BASE = 1.0    # 指數退避起始秒數
+REQUEST_BACKOFF_MAX = 32.0    # 單次等待上限秒數
+
+# 排程產生設定（見 schedule_generator.generate_all_schedules）
+# 預設不平行：平行產生的效益尚未量測到（單核心主機上較慢），需要時先以 benchmark.py --workers 確認再以環境變數開啟
+SCHEDULE_WORKERS = int(os.environ.get("SKSSS_SCHEDULE_WORKERS", "1"))   # 產生大量排程時使用的程序數，1 表示不平行
+STREAM_SYNC_MIN_ROWS = 20000   # 完整同步的預估列數達此值時，改為串流分批寫入（見 stream_master_schedule）
+STREAM_CHUNK_ROWS = 5000       # 串流寫入每批的列數（約略值，以整條課綱路線為單位）
+ROLLING_HORIZON_WEEKS = 12     # 每日延長排程（nightly_extend.py）維持的未來週數
+
+# 儲存後端設定：環境變數 SKSSS_STORAGE_BACKEND 可覆寫
+# "gsheets": Google Sheets；"local": 本機 SQLite 模擬（見 local_sheets.py，離線測試與效能量測用）
+STORAGE_BACKEND = os.environ.get("SKSSS_STORAGE_BACKEND", "gsheets")
+LOCAL_SHEETS_PATH = os.environ.get(
+    "SKSSS_LOCAL_SHEETS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".local_sheets.sqlite3")
+)   # ":memory:" 表示只存在於此程序中
+LOCAL_SHEETS_LATENCY = float(os.environ.get("SKSSS_LOCAL_SHEETS_LATENCY", "0.3"))   # 模擬每個請求的平均延遲秒數
+LOCAL_SHEETS_SEED = int(os.environ.get("SKSSS_LOCAL_SHEETS_SEED", "0"))   # 模擬延遲的亂數種子，固定後每次量測的延遲序列相同
+LOCAL_SHEET_TITLES = ["Config_Syllabus", "Config_CourseLine", "Config_Teacher", "Master_Schedule", "Lesson_Log"]
+
+# 本機鏡像設定（見 sheet_mirror.py）
+MIRROR_KEY = SPREADSHEET_ID if STORAGE_BACKEND == "gsheets" else STORAGE_BACKEND
+MIRROR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), f".sheet_mirror_{MIRROR_KEY}.sqlite3")
+MIRROR_MAX_AGE = 30     # 鏡像內容超過此秒數後，於背景向 Google Sheets 更新
+
+def load_service_account_info():
+    """
+    從 Streamlit secrets 讀取 Service Account 金鑰
+    """
+    return {
+        "type": st.secrets["gcp_service_account"]["type"],
+        "project_id": st.secrets["gcp_service_account"]["project_id"],
+        "private_key_id": st.secrets["gcp_service_account"]["private_key_id"],
+        "private_key": st.secrets["gcp_service_account"]["private_key"],
+        "client_email": st.secrets["gcp_service_account"]["client_email"],
+        "client_id": st.secrets["gcp_service_account"]["client_id"],
+        "auth_uri": st.secrets["gcp_service_account"]["auth_uri"],
+        "token_uri": st.secrets["gcp_service_account"]["token_uri"],
+        "auth_provider_x509_cert_url": st.secrets["gcp_service_account"]["auth_provider_x509_cert_url"],
+        "client_x509_cert_url": st.secrets["gcp_service_account"]["client_x509_cert_url"],
+    }
+
+@st.cache_resource(ttl=CONNECTION_TTL, show_spinner=False)
+def open_connection():
+    """
+    建立整個程序共用的連線
+    - AuthorizedSession 會在 token 過期或收到 401 時自動更新 token
+    - 掛上連線池，讓所有請求重複使用 keep-alive 連線
+    - open_by_key 只在建立時呼叫一次，工作表物件也一併快取
+    失敗時直接拋出例外（不會被快取），下次呼叫會重新嘗試
+    STORAGE_BACKEND 為 "local" 時改為開啟本機模擬的 Spreadsheet（配額與 Google Sheets 相同）
+    """
+    if STORAGE_BACKEND == "local":
+        spreadsheet = open_local_spreadsheet(
+            LOCAL_SHEETS_PATH,
+            LOCAL_SHEET_TITLES,
+            latency=LOCAL_SHEETS_LATENCY,
+            reads_per_minute=READ_REQUESTS_PER_MINUTE,
+            writes_per_minute=WRITE_REQUESTS_PER_MINUTE,
+            seed=LOCAL_SHEETS_SEED,
+        )
+        return {
+            "client": None,
+            "spreadsheet": spreadsheet,
+            "worksheets": {},
+            "lock": threading.Lock(),
+        }
+
+    creds = Credentials.from_service_account_info(load_service_account_info(), scopes=SCOPES)
+
+    session = AuthorizedSession(creds)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+
+    # 自帶 session 時 gspread 規定 auth 傳 None
+    client = gspread.Client(auth=None, session=session)
+    spreadsheet = client.open_by_key(SPREADSHEET_ID)
+
+    return {
+        "client": client,
+        "spreadsheet": spreadsheet,
+        "worksheets": {},
+        "lock": threading.Lock(),
+    }
+
+def reset_connection():
+    """
+    丟棄共用連線，下次使用時重新授權並開啟 Spreadsheet
+    """
+    open_connection.clear()
+
+def is_stale_connection_error(e):
+    """
+    判斷例外是否代表共用連線已失效（憑證無法更新、連線中斷、授權失敗）
+    """
+    if isinstance(e, (RefreshError, TransportError, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(e, gspread.exceptions.APIError) and e.code == 401:
+        return True
+    return False
+
 def get_gspread_client():
     """
     建立並返回 gspread 客戶端
     使用 Streamlit secrets 中的 Service Account 金鑰
     """
     try:
-        # 從 Streamlit secrets 讀取金鑰
-        creds_dict = {
-            "type": st.secrets["gcp_service_account"]["type"],
-            "project_id": st.secrets["gcp_service_account"]["project_id"],
-            "private_key_id": st.secrets["gcp_service_account"]["private_key_id"],
-            "private_key": st.secrets["gcp_service_account"]["private_key"],
-            "client_email": st.secrets["gcp_service_account"]["client_email"],
-            "client_id": st.secrets["gcp_service_account"]["client_id"],
-            "auth_uri": st.secrets["gcp_service_account"]["auth_uri"],
-            "token_uri": st.secrets["gcp_service_account"]["token_uri"],
-            "auth_provider_x509_cert_url": st.secrets["gcp_service_account"]["auth_provider_x509_cert_url"],
-            "client_x509_cert_url": st.secrets["gcp_service_account"]["client_x509_cert_url"],
-        }
-        
-        # 建立憑證
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        
-        # 授權並返回客戶端
-        client = gspread.authorize(creds)
-        return client
-    
+        return open_connection()["client"]
+
     except Exception as e:
         st.error(f"❌ Google Sheets 連線失敗: {str(e)}")
         return None
@@ -49,12 +153,23 @@ def get_spreadsheet():
     """
     取得指定的 Google Spreadsheet 物件
     """
-    client = get_gspread_client()
-    if client:
-        try:
-            spreadsheet = client.open_by_key(SPREADSHEET_ID)
-            return spreadsheet
-        except Exception as e:
-            st.error(f"❌ 無法開啟 Spreadsheet: {str(e)}")
-            return None
-    return None
+    try:
+        return open_connection()["spreadsheet"]
+    except Exception as e:
+        st.error(f"❌ 無法開啟 Spreadsheet: {str(e)}")
+        return None
+
+def open_worksheet(title):
+    """
+    取得指定名稱的工作表物件（快取於共用連線中），失敗時拋出例外
+    spreadsheet.worksheet() 每次都會讀取一次 metadata，快取後可省下這次請求
+    """
+    connection = open_connection()
+
+    with connection["lock"]:
+        worksheet = connection["worksheets"].get(title)
+        if worksheet is None:
+            worksheet = connection["spreadsheet"].worksheet(title)
+            connection["worksheets"][title] = worksheet
+
+    return worksheet
@@ -0,0 +1,339 @@
+"""
+本機工作表後端模組
+以 SQLite 模擬 Google Sheets，提供與 gspread 相同介面的 Spreadsheet / Worksheet 物件
+（只實作 sheets_handler 使用到的方法），用於離線測試、壓力測試與效能量測：
+- 每個請求都有模擬的網路延遲
+- 讀取、寫入各自有每分鐘配額，超過時拋出 code 為 429 的例外（與 gspread.APIError 相同屬性），
+  sheets_request 的限流與重試流程會照常運作
+- 儲存格一律以字串保存，讀取結果與 Google Sheets 的格式化值相同
+由 config.STORAGE_BACKEND 選擇（見 config.open_connection）
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range
+
+class LocalQuotaError(Exception):
+    """
+    模擬 Google Sheets 的 429 配額錯誤
+    """
+
+    def __init__(self, kind, per_minute):
+        super().__init__(f"Quota exceeded for {kind} requests per minute ({per_minute})")
+        self.code = 429
+
+def cell_text(value):
+    """
+    儲存格的顯示值（與 Google Sheets 讀回的格式化值相同）
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def trim_row(row):
+    """
+    去除列尾端的空白儲存格（Google Sheets 不會回傳）
+    """
+    end = len(row)
+    while end > 0 and row[end - 1] == "":
+        end -= 1
+    return row[:end]
+
+def sheet_title(range_name):
+    """
+    由 A1 範圍取出工作表名稱與範圍部分，例如 "'Master_Schedule'!A2:C" -> ("Master_Schedule", "A2:C")
+    """
+    title, _, cells = range_name.partition("!")
+    if len(title) >= 2 and title[0] == "'" and title[-1] == "'":
+        title = title[1:-1].replace("''", "'")
+    return title, cells
+
+class LocalSpreadsheet:
+    """
+    以 SQLite 保存的 Spreadsheet，介面與 gspread.Spreadsheet 相同
+    path 為 ":memory:" 時只存在於此程序中
+    """
+
+    def __init__(self, path, latency=0.0, reads_per_minute=None, writes_per_minute=None, seed=None):
+        self.path = path
+        self.title = "Local Spreadsheet"
+        self.id = f"local:{path}"
+        self.latency = latency
+        self.quota = {"read": reads_per_minute, "write": writes_per_minute}
+        self.stats = {}
+
+        self._random = random.Random(seed)
+        self._requests = {"read": deque(), "write": deque()}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS worksheets ("
+            " title TEXT PRIMARY KEY,"
+            " position INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cells ("
+            " title TEXT NOT NULL,"
+            " row_number INTEGER NOT NULL,"
+            " row_values TEXT NOT NULL,"
+            " PRIMARY KEY (title, row_number))"
+        )
+        self._conn.commit()
+
+    # ============================================
+    # 模擬延遲與配額
+    # ============================================
+    def request(self, kind, method):
+        """
+        記錄一次 API 請求：檢查每分鐘配額，並等待模擬的網路延遲
+        """
+        per_minute = self.quota[kind]
+        with self._lock:
+            self.stats[method] = self.stats.get(method, 0) + 1
+            if per_minute:
+                now = time.monotonic()
+                window = self._requests[kind]
+                while window and now - window[0] >= 60:
+                    window.popleft()
+                if len(window) >= per_minute:
+                    raise LocalQuotaError(kind, per_minute)
+                window.append(now)
+            delay = self.latency * self._random.uniform(0.5, 1.5) if self.latency else 0
+
+        if delay:
+            time.sleep(delay)
+
+    # ============================================
+    # 儲存格存取（呼叫前已記錄請求）
+    # ============================================
+    def read_rows(self, title, start=1, end=None):
+        """
+        讀取第 start 到 end 列（含），返回 {列號: 儲存格 list}，只包含有值的列
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row_number, row_values FROM cells WHERE title = ? AND row_number >= ? AND row_number <= ?",
+                (title, start, end if end is not None else 2 ** 62)
+            ).fetchall()
+        return {number: json.loads(values) for number, values in rows}
+
+    def write_rows(self, title, rows):
+        """
+        覆寫多列：rows 為 {列號: 儲存格 list}，整列空白時刪除該列
+        """
+        stored = [(title, number, json.dumps(row)) for number, row in rows.items() if row]
+        removed = [(title, number) for number, row in rows.items() if not row]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO cells VALUES (?, ?, ?)", stored)
+            self._conn.executemany("DELETE FROM cells WHERE title = ? AND row_number = ?", removed)
+            self._conn.commit()
+
+    def last_row(self, title):
+        """
+        最後一個有值的列號（空工作表為 0）
+        """
+        with self._lock:
+            last = self._conn.execute("SELECT MAX(row_number) FROM cells WHERE title = ?", (title,)).fetchone()[0]
+        return last or 0
+
+    def clear_sheet(self, title):
+        with self._lock:
+            self._conn.execute("DELETE FROM cells WHERE title = ?", (title,))
+            self._conn.commit()
+
+    def has_worksheet(self, title):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM worksheets WHERE title = ?", (title,)).fetchone() is not None
+
+    # ============================================
+    # gspread.Spreadsheet 介面
+    # ============================================
+    def worksheet(self, title):
+        self.request("read", "worksheet")
+        if not self.has_worksheet(title):
+            raise WorksheetNotFound(title)
+        return LocalWorksheet(self, title)
+
+    def worksheets(self):
+        self.request("read", "worksheets")
+        with self._lock:
+            titles = [row[0] for row in self._conn.execute("SELECT title FROM worksheets ORDER BY position")]
+        return [LocalWorksheet(self, title) for title in titles]
+
+    def add_worksheet(self, title, rows=1000, cols=26):
+        self.request("write", "add_worksheet")
+        self.create_worksheet(title)
+        return LocalWorksheet(self, title)
+
+    def values_batch_get(self, ranges, params=None):
+        """
+        與 spreadsheets.values.batchGet 相同格式的回應（每列去除尾端空白，尾端空白列不回傳）
+        """
+        self.request("read", "values_batch_get")
+
+        value_ranges = []
+        for range_name in ranges:
+            title, cells = sheet_title(range_name)
+            if not self.has_worksheet(title):
+                raise WorksheetNotFound(title)
+            value_range = {"range": range_name, "majorDimension": "ROWS"}
+            values = LocalWorksheet(self, title).range_values(cells)
+            if values:
+                value_range["values"] = values
+            value_ranges.append(value_range)
+
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    # ============================================
+    # 初始化
+    # ============================================
+    def create_worksheet(self, title):
+        """
+        建立工作表（已存在時不動作），不計入請求
+        """
+        with self._lock:
+            position = self._conn.execute("SELECT COUNT(*) FROM worksheets").fetchone()[0]
+            self._conn.execute("INSERT OR IGNORE INTO worksheets VALUES (?, ?)", (title, position))
+            self._conn.commit()
+
+    def import_sheets(self, sheet_values):
+        """
+        以指定內容取代工作表（例如載入合成資料），不計入請求
+        sheet_values: dict，{工作表名稱: 儲存格值（含表頭列）}
+        """
+        for title, values in sheet_values.items():
+            self.create_worksheet(title)
+            self.clear_sheet(title)
+            self.write_rows(title, {i + 1: trim_row([cell_text(v) for v in row]) for i, row in enumerate(values)})
+
+class LocalWorksheet:
+    """
+    LocalSpreadsheet 中的工作表，介面與 gspread.Worksheet 相同
+    """
+
+    def __init__(self, spreadsheet, title):
+        self.spreadsheet = spreadsheet
+        self.title = title
+
+    def range_values(self, cells=""):
+        """
+        A1 範圍內的值（空字串表示整個工作表），格式與 values.get 相同
+        """
+        grid = a1_range_to_grid_range(cells) if cells else {}
+        start = grid.get("startRowIndex", 0) + 1
+        end = grid.get("endRowIndex")
+        first_col = grid.get("startColumnIndex", 0)
+        end_col = grid.get("endColumnIndex")
+
+        rows = self.spreadsheet.read_rows(self.title, start, end)
+        if not rows:
+            return []
+
+        values = [trim_row(rows.get(number, [])[first_col:end_col]) for number in range(start, max(rows) + 1)]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def get_all_values(self):
+        """
+        整個工作表的值，補齊為矩形（與 gspread 相同）
+        """
+        self.spreadsheet.request("read", "get_all_values")
+        values = self.range_values()
+        width = max((len(row) for row in values), default=0)
+        return [row + [""] * (width - len(row)) for row in values]
+
+    def row_values(self, row):
+        self.spreadsheet.request("read", "row_values")
+        return self.spreadsheet.read_rows(self.title, row, row).get(row, [])
+
+    def col_values(self, col):
+        self.spreadsheet.request("read", "col_values")
+        rows = self.spreadsheet.read_rows(self.title)
+        values = [
+            row[col - 1] if len(row) >= col else ""
+            for row in (rows.get(number, []) for number in range(1, max(rows, default=0) + 1))
+        ]
+        return trim_row(values)
+
+    def clear(self):
+        self.spreadsheet.request("write", "clear")
+        self.spreadsheet.clear_sheet(self.title)
+
+    def append_rows(self, values, value_input_option=None, **kwargs):
+        """
+        追加在最後一個有值的列之後
+        """
+        self.spreadsheet.request("write", "append_rows")
+        self.insert_after_last(values)
+
+    def append_row(self, values, value_input_option=None, **kwargs):
+        self.spreadsheet.request("write", "append_row")
+        self.insert_after_last([values])
+
+    def insert_after_last(self, values):
+        first = self.spreadsheet.last_row(self.title) + 1
+        self.spreadsheet.write_rows(
+            self.title,
+            {first + i: trim_row([cell_text(v) for v in row]) for i, row in enumerate(values)}
+        )
+
+    def batch_update(self, data, **kwargs):
+        """
+        data: [{'range': A1 範圍, 'values': 二維 list}]，從範圍左上角開始覆寫
+        """
+        self.spreadsheet.request("write", "batch_update")
+
+        for update in data:
+            grid = a1_range_to_grid_range(sheet_title(update["range"])[1] or update["range"])
+            start = grid.get("startRowIndex", 0) + 1
+            first_col = grid.get("startColumnIndex", 0)
+            values = update["values"]
+
+            rows = self.spreadsheet.read_rows(self.title, start, start + len(values) - 1)
+            changed = {}
+            for i, new_values in enumerate(values):
+                row = rows.get(start + i, [])
+                row = row + [""] * max(0, first_col + len(new_values) - len(row))
+                row[first_col:first_col + len(new_values)] = [cell_text(v) for v in new_values]
+                changed[start + i] = trim_row(row)
+            self.spreadsheet.write_rows(self.title, changed)
+
+    def batch_clear(self, ranges):
+        """
+        清空多個 A1 範圍（例如整列範圍 "5:10"）
+        """
+        self.spreadsheet.request("write", "batch_clear")
+
+        for range_name in ranges:
+            grid = a1_range_to_grid_range(sheet_title(range_name)[1] or range_name)
+            start = grid.get("startRowIndex", 0) + 1
+            end = grid.get("endRowIndex")
+            first_col = grid.get("startColumnIndex", 0)
+            end_col = grid.get("endColumnIndex")
+
+            changed = {}
+            for number, row in self.spreadsheet.read_rows(self.title, start, end).items():
+                stop = len(row) if end_col is None else min(end_col, len(row))
+                row[first_col:stop] = [""] * max(0, stop - first_col)
+                changed[number] = trim_row(row)
+            self.spreadsheet.write_rows(self.title, changed)
+
+def open_local_spreadsheet(path, sheet_titles=(), latency=0.0, reads_per_minute=None, writes_per_minute=None, seed=None):
+    """
+    開啟本機 Spreadsheet，並建立尚不存在的工作表
+    """
+    spreadsheet = LocalSpreadsheet(path, latency, reads_per_minute, writes_per_minute, seed)
+    for title in sheet_titles:
+        spreadsheet.create_worksheet(title)
+    return spreadsheet
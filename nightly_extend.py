@@ -0,0 +1,56 @@
+"""
+Nightly Schedule Extension
+Keeps every active course line ROLLING_HORIZON_WEEKS weeks ahead of today
+by appending new lessons after each line's last scheduled lesson
+(a line whose last lesson is already past continues from today).
+Already scheduled (and taught) rows are never rewritten. The appended
+segments are recorded in the sync state, so later syncs regenerate the same
+rows as long as the line's config is unchanged.
+
+Usage (e.g. from cron, in the app directory so .streamlit/secrets.toml is found):
+    python nightly_extend.py
+"""
+
+import sys
+from datetime import datetime, timedelta
+
+from config import ROLLING_HORIZON_WEEKS
+from schedule_generator import courseline_fingerprints, extend_schedules, record_extensions
+from sheets_handler import (
+    append_master_schedule, fetch_sheet_values, load_sync_state, save_sync_state, sheet_to_dataframe
+)
+
+def main():
+    # Read directly from Google Sheets (not the local mirror) so the job sees the latest rows
+    names = ["Config_CourseLine", "Config_Syllabus", "Master_Schedule"]
+    sheet_values = fetch_sheet_values(names)
+    sheets = {name: sheet_to_dataframe(name, sheet_values[name]) for name in names}
+    
+    today = datetime.now().date()
+    until = today + timedelta(weeks=ROLLING_HORIZON_WEEKS)
+    new_rows = extend_schedules(
+        sheets['Config_CourseLine'],
+        sheets['Master_Schedule'],
+        sheets['Config_Syllabus'],
+        until=until,
+        today=today
+    )
+    
+    if len(new_rows) == 0:
+        print(f"All course lines are scheduled through {until}")
+        return 0
+    
+    if not append_master_schedule(new_rows):
+        print("Failed to append to Master_Schedule", file=sys.stderr)
+        return 1
+    
+    fingerprints = courseline_fingerprints(sheets['Config_CourseLine'], sheets['Config_Syllabus'], weeks=12)
+    save_sync_state('schedule_extensions', record_extensions(
+        load_sync_state('schedule_extensions'), sheets['Master_Schedule'], new_rows, fingerprints, today=today
+    ))
+    
+    print(f"Appended {len(new_rows)} lessons for {new_rows['CourseLineID'].nunique()} course lines (through {until})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+排程衝堂檢查模組
+找出同一日期、同一時間被重複安排的老師或教室
+整張 Master_Schedule 以整數分組鍵排序一次（O(n log n)）完成，不逐列比對
+"""
+
+import numpy as np
+import pandas as pd
+
+# 需要檢查的資源欄位：同一時段同一個值只能出現一次
+CONFLICT_RESOURCES = ['Teacher_ID', 'Classroom']
+
+# 視為「未指定」的值，不列入檢查
+BLANK_VALUES = ['', 'nan', 'None', '-']
+
+def normalize_dates(dates):
+    """
+    將日期欄位統一為 'YYYY-MM-DD' 字串（Master_Schedule 讀入後為 datetime，新產生的排程為字串）
+    """
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates.dt.strftime('%Y-%m-%d')
+    if dates.dtype == object:
+        # 兩者合併後為混合型態，先統一轉為日期
+        return pd.to_datetime(dates, errors='coerce').dt.strftime('%Y-%m-%d')
+    return dates.astype(str)
+
+def find_conflicts(df_schedule, resources=CONFLICT_RESOURCES, involving=None):
+    """
+    找出排程中的衝堂
+
+    Parameters:
+    - df_schedule: 排程 DataFrame（需有 Date、Time 與資源欄位）
+    - resources: 要檢查的資源欄位
+    - involving: Slot_ID 集合，只回報包含其中任一堂課的衝堂（例如新增課綱路線時）
+
+    Returns:
+    - DataFrame，每個衝堂一列：
+        Resource（欄位名稱）、Value（老師或教室）、Date、Time、Count（重複堂數）、
+        CourseLineIDs、Slot_IDs（以逗號分隔）
+    依 Date、Time、Resource 排序；沒有衝堂時返回空的 DataFrame
+    """
+    columns = ['Resource', 'Value', 'Date', 'Time', 'Count', 'CourseLineIDs', 'Slot_IDs']
+    if df_schedule is None or df_schedule.empty:
+        return pd.DataFrame(columns=columns)
+
+    # 同一堂課重複出現（Slot_ID 相同）不算衝堂
+    if 'Slot_ID' in df_schedule.columns:
+        df_schedule = df_schedule[~df_schedule['Slot_ID'].duplicated().to_numpy()]
+
+    def text_column(name):
+        if name not in df_schedule.columns:
+            return np.full(len(df_schedule), '', dtype=object)
+        return df_schedule[name].astype(str).to_numpy(dtype=object)
+
+    # 日期、時間先轉成整數編號，分組鍵只需整數運算
+    date_codes, date_labels = pd.factorize(normalize_dates(df_schedule['Date']).to_numpy(dtype=object))
+    time_codes, time_labels = pd.factorize(text_column('Time'))
+    courseline_ids = text_column('CourseLineID')
+    slot_ids = text_column('Slot_ID')
+    if involving is not None:
+        involving = pd.Series(slot_ids).isin(set(map(str, involving))).to_numpy()
+
+    reports = []
+    for resource in resources:
+        if resource not in df_schedule.columns:
+            continue
+
+        value_codes, value_labels = pd.factorize(df_schedule[resource].astype(str).str.strip().to_numpy(dtype=object))
+
+        # 未指定老師或教室的堂次不檢查
+        rows = np.flatnonzero(~np.isin(value_labels, BLANK_VALUES)[value_codes])
+        if len(rows) == 0:
+            continue
+
+        # 分組鍵 = (日期, 時間, 資源) 編號，排序後相鄰且相同的就是同一時段
+        keys = (date_codes[rows].astype(np.int64) * len(time_labels) + time_codes[rows]) * len(value_labels) + value_codes[rows]
+        order = np.argsort(keys, kind='stable')
+        rows = rows[order]
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+
+        clash = counts > 1
+        if involving is not None:
+            clash &= np.add.reduceat(involving[rows].astype(int), starts) > 0
+
+        for start, count in zip(starts[clash], counts[clash]):
+            members = rows[start:start + count]
+            first = members[0]
+            reports.append({
+                'Resource': resource,
+                'Value': value_labels[value_codes[first]],
+                'Date': date_labels[date_codes[first]],
+                'Time': time_labels[time_codes[first]],
+                'Count': int(count),
+                'CourseLineIDs': ', '.join(dict.fromkeys(courseline_ids[members])),
+                'Slot_IDs': ', '.join(slot_ids[members]),
+            })
+
+    if not reports:
+        return pd.DataFrame(columns=columns)
+
+    conflicts = pd.DataFrame(reports, columns=columns)
+    return conflicts.sort_values(['Date', 'Time', 'Resource', 'Value'], kind='stable').reset_index(drop=True)
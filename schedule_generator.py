@@ -3,10 +3,73 @@
 根據 Config_Class 和 Config_Syllabus 自動產生 Master_Schedule
 """
 
+import hashlib
+import multiprocessing
+import os
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
 import uuid
 
+WEEKDAY_NAMES = np.array(['週一', '週二', '週三', '週四', '週五', '週六', '週日'], dtype=object)
+
+# 多程序產生排程的門檻：時段數少於此值時一律在單一程序中產生
+# spawn 子程序需 pickle 課綱索引與每一段設定，並重新載入模組；
+# 單核心主機實測 50k 條路線（約 10 萬個時段）：單一程序 6.1 秒，4 個程序 12.9 秒，
+# 多核心主機是否有效益需先以 benchmark.py --workers 量測
+PARALLEL_MIN_CONFIGS = 200000
+
+# Slot_ID 的命名空間（固定值，改變會讓所有既有 Slot_ID 失效）
+SLOT_ID_NAMESPACE = uuid.UUID('6f1d3c8e-2b7a-5e4f-9c1d-0a8b7e6f5d4c')
+
+def make_slot_ids(courseline_ids, dates, times):
+    """
+    由 CourseLineID + 日期 + 時間產生固定的 Slot_ID（UUID v5）
+    同一堂課每次重新產生都會得到相同的 Slot_ID，可直接用來比對差異
+    
+    結果與 uuid.uuid5(SLOT_ID_NAMESPACE, f"{CourseLineID}|{日期}|{時間}") 完全相同，
+    但不逐列建立 UUID 物件：路線、日期、時間各自只編碼一次，逐列只做 SHA-1，
+    版本位元與十六進位格式以陣列運算一次完成
+    """
+    if len(courseline_ids) == 0:
+        return np.array([], dtype=object)
+    
+    line_codes, line_values = pd.factorize(pd.Series(courseline_ids, dtype=object))
+    date_codes, date_values = pd.factorize(pd.Series(dates, dtype=object))
+    time_codes, time_values = pd.factorize(pd.Series(times, dtype=object))
+    
+    # 名稱 = 命名空間 + "CourseLineID|" + "日期|" + "時間"（UTF-8），與 uuid5 的輸入相同
+    line_prefixes = [SLOT_ID_NAMESPACE.bytes + f"{value}|".encode() for value in line_values]
+    date_parts = [f"{value}|".encode() for value in date_values]
+    time_parts = [f"{value}".encode() for value in time_values]
+    
+    sha1 = hashlib.sha1
+    digests = b"".join([
+        sha1(line_prefixes[line] + date_parts[date] + time_parts[time]).digest()
+        for line, date, time in zip(line_codes.tolist(), date_codes.tolist(), time_codes.tolist())
+    ])
+    
+    # 取 SHA-1 前 16 位元組，設定版本（5）與變體位元（RFC 4122）
+    raw = np.frombuffer(digests, dtype=np.uint8).reshape(-1, 20)[:, :16].copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x50
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    
+    # 32 個十六進位字元插入連字號：8-4-4-4-12
+    hex_digits = np.frombuffer(raw.tobytes().hex().encode(), dtype=np.uint8).reshape(-1, 32)
+    text = np.full((len(raw), 36), ord('-'), dtype=np.uint8)
+    for start, stop, offset in ((0, 8, 0), (8, 12, 9), (12, 16, 14), (16, 20, 19), (20, 32, 24)):
+        text[:, offset:offset + stop - start] = hex_digits[:, start:stop]
+    return text.view('S36').ravel().astype(str).astype(object)
+
+def weekday_of(dates):
+    """
+    datetime64[D] 陣列的星期（0=週一 ... 6=週日）
+    1970-01-01 為週四
+    """
+    return (dates.astype('int64') + 3) % 7
+
 def generate_schedule(courseline_config, syllabus_config, weeks=12):
     """
     單一該時段的排課函式（保留以供相容性使用）
@@ -14,7 +77,210 @@ def generate_schedule(courseline_config, syllabus_config, weeks=12):
     """
     return generate_interleaved_schedule([courseline_config], syllabus_config, weeks)
 
-def generate_interleaved_schedule(courseline_configs, syllabus_config, weeks=12):
+def build_syllabus_index(syllabus_config):
+    """
+    建立課綱索引（每次載入 Config_Syllabus 只需建立一次）
+    教材依 SyllabusID、Sequence 排序成連續的一段，記錄每個 SyllabusID 的起點與教材數，
+    查詢某個課綱的教材只需切片，不必再篩選與排序整張表
+
+    Returns:
+    - dict：
+        'books': 排序後的教材 DataFrame
+        'ranges': {SyllabusID: (起點, 教材數)}
+        'arrays': {欄位名稱: 依同樣順序排列的 numpy 陣列}（Unit 欄位不存在時以 Chapters 代替）
+    """
+    books = syllabus_config.sort_values(['SyllabusID', 'Sequence'], kind='stable').reset_index(drop=True)
+    
+    ranges = {}
+    if len(books) > 0:
+        ids, starts, counts = np.unique(books['SyllabusID'].to_numpy(), return_index=True, return_counts=True)
+        ranges = {syllabus_id: (int(start), int(count)) for syllabus_id, start, count in zip(ids, starts, counts)}
+    
+    arrays = {name: books[name].to_numpy(dtype=object) for name in books.columns}
+    if 'Unit' not in arrays and 'Chapters' in arrays:
+        arrays['Unit'] = arrays['Chapters']
+    
+    return {'books': books, 'ranges': ranges, 'arrays': arrays}
+
+def syllabus_books(syllabus_index, syllabus_id):
+    """
+    取得某個課綱的教材（依 Sequence 排序），找不到時返回空的 DataFrame
+    """
+    start, count = syllabus_index['ranges'].get(syllabus_id, (0, 0))
+    return syllabus_index['books'].iloc[start:start + count]
+
+def resolve_lines(configs, line_of_config, syllabus_index):
+    """
+    整理每條課綱路線的共用資訊（取該路線的第一個時段），並算出每個時段第一次上課的日期
+    找不到教材的課綱路線會被排除；全部都找不到時返回 None
+    
+    Returns:
+    - dict：
+        base: 每條路線的共用設定（依路線編號）
+        configs / config_line: 保留的時段設定與其路線編號
+        keep: 每個輸入時段是否保留（bool 陣列）
+        book_start / book_count / start_sequence: 每條路線的教材起點、教材數、開始序列
+        first_dates: 每個時段第一次上課的日期（datetime64[D]）
+    """
+    # 每條課綱路線的共用資訊（取該路線的第一個時段）
+    line_ids, base_pos = np.unique(line_of_config, return_index=True)
+    base = configs.iloc[base_pos]
+    
+    ranges = [syllabus_index['ranges'].get(syllabus_id) for syllabus_id in base['SyllabusID']]
+    
+    # 找不到教材的課綱路線不排課
+    has_books = np.array([r is not None for r in ranges], dtype=bool)
+    if not has_books.any():
+        return None
+    
+    line_number = np.full(line_ids.max() + 1, -1)
+    line_number[line_ids] = np.arange(len(line_ids))
+    line_book_start = np.array([r[0] if r else 0 for r in ranges])
+    line_book_count = np.array([r[1] if r else 1 for r in ranges])
+    if 'Start_Sequence' in base.columns:
+        line_start_sequence = base['Start_Sequence'].astype(int).to_numpy()
+    else:
+        line_start_sequence = np.ones(len(base), dtype=int)
+    
+    keep = has_books[line_number[line_of_config]]
+    configs = configs[keep]
+    
+    # 以陣列運算算出每個時段的第一次上課日期
+    start_dates = pd.to_datetime(configs['Start_Date'], format='mixed').to_numpy().astype('datetime64[D]')
+    target_weekdays = configs['Weekday'].astype(int).to_numpy() - 1  # 0-6
+    days_ahead = (target_weekdays - weekday_of(start_dates)) % 7
+    
+    return {
+        'base': base,
+        'configs': configs,
+        'config_line': line_number[line_of_config[keep]],
+        'keep': keep,
+        'book_start': line_book_start,
+        'book_count': line_book_count,
+        'start_sequence': line_start_sequence,
+        'first_dates': start_dates + days_ahead.astype('timedelta64[D]'),
+    }
+
+def build_schedule(configs, line_of_config, syllabus_index, weeks):
+    """
+    一次產生多條課綱路線的排程（核心運算，全部以陣列完成）
+    
+    Parameters:
+    - configs: DataFrame，所有時段設定（每列一個時段）
+    - line_of_config: 每個時段所屬課綱路線的編號（0..L-1），編號順序即同日同時段的排列順序
+    - syllabus_index: build_syllabus_index 的結果
+    - weeks: 產生幾週的課程（整數，或每個時段各自的週數陣列，見 expand_extensions）
+    
+    每條課綱路線以第一個時段的設定作為共用資訊（CourseLineID、課綱、開始序列），
+    所有時段依「日期 + 時間」排序後共用同一份課綱進度
+    
+    Returns:
+    - DataFrame: 依日期、時間排序的排程資料
+    """
+    line_of_config = np.asarray(line_of_config)
+    if len(configs) == 0:
+        return pd.DataFrame()
+    
+    config_weeks = np.broadcast_to(np.maximum(np.asarray(weeks, dtype=np.int64), 0), (len(configs),))
+    if config_weeks.max() == 0:
+        return pd.DataFrame()
+    
+    lines = resolve_lines(configs, line_of_config, syllabus_index)
+    if lines is None:
+        return pd.DataFrame()
+    
+    config_weeks = config_weeks[lines['keep']]
+    configs = lines['configs']
+    config_line = lines['config_line']
+    line_book_start = lines['book_start']
+    line_book_count = lines['book_count']
+    line_start_sequence = lines['start_sequence']
+    first_class_dates = lines['first_dates']
+    
+    # 步驟 1: 產生所有時段未來 N 週的日期（依時段、週攤平成一維）
+    slot_config = np.repeat(np.arange(len(configs)), config_weeks)
+    week_number = np.arange(len(slot_config)) - np.repeat(np.cumsum(config_weeks) - config_weeks, config_weeks)
+    class_dates = first_class_dates[slot_config] + (7 * week_number).astype('timedelta64[D]')
+    slot_line = config_line[slot_config]
+    slot_times = configs['Time'].to_numpy(dtype=object)[slot_config]
+    time_keys = slot_times.astype(str)
+    
+    # 步驟 2: 每條路線內依「日期 + 時間」排序
+    # 這就是共用進度的關鍵：先排好順序，再填內容
+    order = np.lexsort((time_keys, class_dates, slot_line))
+    slot_line = slot_line[order]
+    
+    # 每堂課在所屬路線內的序號
+    line_first = np.searchsorted(slot_line, slot_line, side='left')
+    lesson_number = np.arange(len(order)) - line_first
+    
+    # 步驟 3: 依序填入課綱進度（一次取出所有堂次的教材）
+    book_pos = (
+        line_book_start[slot_line]
+        + (line_start_sequence[slot_line] - 1 + lesson_number) % line_book_count[slot_line]
+    )
+    
+    # 步驟 4: 全部路線合併後依「日期 + 時間」排序（同時段依路線順序）
+    final = np.lexsort((time_keys[order], class_dates[order]))
+    order = order[final]
+    slot_line = slot_line[final]
+    book_pos = book_pos[final]
+    slot_config = slot_config[order]
+    class_dates = class_dates[order]
+    
+    return assemble_schedule(lines, syllabus_index, slot_config, slot_line, book_pos, class_dates)
+
+def assemble_schedule(lines, syllabus_index, slot_config, slot_line, book_pos, class_dates):
+    """
+    將每堂課的時段、路線、教材位置與日期組成 Master_Schedule 格式的 DataFrame
+    
+    Parameters:
+    - lines: resolve_lines 的結果
+    - syllabus_index: build_syllabus_index 的結果
+    - slot_config / slot_line / book_pos / class_dates: 每堂課的時段編號、路線編號、教材位置、日期
+    """
+    book_arrays = syllabus_index['arrays']
+    base = lines['base']
+    configs = lines['configs']
+    
+    def line_column(name):
+        return base[name].to_numpy(dtype=object)[slot_line]
+    
+    def config_column(name):
+        return configs[name].to_numpy(dtype=object)[slot_config]
+    
+    def book_column(name):
+        if name in book_arrays:
+            return book_arrays[name][book_pos]
+        return np.full(len(book_pos), '', dtype=object)
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    courseline_ids = line_column('CourseLineID')
+    date_strings = np.datetime_as_string(class_dates, unit='D')
+    slot_times = config_column('Time')
+    
+    return pd.DataFrame({
+        'Slot_ID': make_slot_ids(courseline_ids, date_strings, slot_times),
+        'CourseLineID': courseline_ids,
+        'CourseName': line_column('CourseName'),
+        'SyllabusID': line_column('SyllabusID'),
+        'SyllabusName': book_column('SyllabusName'),
+        'Date': date_strings,
+        'Weekday': WEEKDAY_NAMES[weekday_of(class_dates)],
+        'Time': slot_times,
+        'Classroom': config_column('Classroom'),
+        'Teacher_ID': config_column('Teacher_ID'),
+        'Level_ID': book_arrays['Level_ID'][lines['book_start'][slot_line]],
+        'Book_Code': book_column('Book_Code'),
+        'Book_Full_Name': book_arrays['Book_Full_Name'][book_pos],
+        'Unit': book_column('Unit'),
+        'Status': '正常',
+        'Note': '',
+        'Created_At': now,
+        'Updated_At': now
+    })
+
+def generate_interleaved_schedule(courseline_configs, syllabus_config, weeks=12, syllabus_index=None):
     """
     [新功能] 針對同一個 CourseLineID 的多個時段進行「交錯排課」
     
@@ -22,135 +288,424 @@ def generate_interleaved_schedule(courseline_configs, syllabus_config, weeks=12)
     - courseline_configs: List[dict]，包含該課綱路線的所有時段設定 (Mon, Wed...)
     - syllabus_config: Config_Syllabus 的所有教材
     - weeks: 產生幾週的課程
+    - syllabus_index: 已建立的課綱索引（build_syllabus_index），提供時不再篩選 syllabus_config
     
     Returns:
     - DataFrame: 依日期排序並共用進度的排程資料
     """
     if not courseline_configs:
         return pd.DataFrame()
+    
+    if syllabus_index is None:
+        # 取得基礎共用資訊（假設同一個 ID 的課程，課綱、老師、開始序列都是一樣的）
+        syllabus_id = courseline_configs[0]['SyllabusID']
+        
+        # 只需要該課綱的教材
+        syllabus_index = build_syllabus_index(syllabus_config[syllabus_config['SyllabusID'] == syllabus_id])
+    
+    # 所有時段都屬於同一條路線（編號 0）
+    return build_schedule(
+        pd.DataFrame(courseline_configs),
+        np.zeros(len(courseline_configs), dtype=int),
+        syllabus_index,
+        weeks
+    )
+
+def build_schedule_chunk(args):
+    """
+    子程序的進入點（需為模組層級函式才能 pickle）
+    """
+    return build_schedule(*args)
 
-    # 取得基礎共用資訊（假設同一個 ID 的課程，課綱、老師、開始序列都是一樣的）
-    base_config = courseline_configs[0]
-    courseline_id = base_config['CourseLineID']
-    course_name = base_config['CourseName']
-    syllabus_id = base_config['SyllabusID']
-    start_sequence = int(base_config.get('Start_Sequence', 1))
+def build_schedule_parallel(configs, line_of_config, syllabus_index, weeks, workers):
+    """
+    將課綱路線依編號切成 workers 段，分別在子程序中執行 build_schedule
+    各段依編號順序串接後，再依「日期 + 時間」穩定排序，
+    結果與單一程序執行 build_schedule 完全相同（同時段依路線順序）
+    """
+    line_count = int(line_of_config.max()) + 1
+    chunks = []
+    for lines in np.array_split(np.arange(line_count), workers):
+        if len(lines) == 0:
+            continue
+        mask = (line_of_config >= lines[0]) & (line_of_config <= lines[-1])
+        chunks.append((
+            configs[mask].reset_index(drop=True),
+            line_of_config[mask] - lines[0],
+            syllabus_index,
+            weeks[mask] if np.ndim(weeks) else weeks
+        ))
     
-    # 取得課綱教材
-    syllabus_data = syllabus_config[syllabus_config['SyllabusID'] == syllabus_id].sort_values('Sequence')
+    # 以 spawn 建立子程序：不複製呼叫端（例如 Streamlit 伺服器）的執行緒與鎖，避免 fork 後死結
+    with ProcessPoolExecutor(max_workers=len(chunks), mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = [df for df in executor.map(build_schedule_chunk, chunks) if not df.empty]
     
-    if len(syllabus_data) == 0:
-        return pd.DataFrame()
-        
-    level_id = syllabus_data.iloc[0]['Level_ID']
-    total_books = len(syllabus_data)
-    
-    # 步驟 1: 收集所有可能的上課日期與時段資訊
-    all_slots_pool = []
-    
-    for config in courseline_configs:
-        weekday = int(config['Weekday']) # 1-7
-        time = config['Time']
-        classroom = config['Classroom']
-        teacher_id = config['Teacher_ID']
-        start_date = pd.to_datetime(config['Start_Date'])
-        
-        # 計算該時段的第一次上課日期
-        target_weekday = weekday - 1  # 0-6
-        days_ahead = target_weekday - start_date.weekday()
-        if days_ahead < 0:
-            days_ahead += 7
-        first_class_date = start_date + timedelta(days=days_ahead)
-        
-        # 產生該時段未來 N 週的日期
-        for week in range(weeks):
-            class_date = first_class_date + timedelta(weeks=week)
-            all_slots_pool.append({
-                'Date': class_date,
-                'Time': time,
-                'Weekday_Num': class_date.weekday(), # 0-6 for sorting
-                'Weekday_Str': ['週一', '週二', '週三', '週四', '週五', '週六', '週日'][class_date.weekday()],
-                'Classroom': classroom,
-                'Teacher_ID': teacher_id
-            })
-            
-    # 步驟 2: 將所有日期依「日期 + 時間」排序
-    # 這就是共用進度的關鍵：先排好順序，再填內容
-    df_pool = pd.DataFrame(all_slots_pool)
-    if df_pool.empty:
+    if not results:
         return pd.DataFrame()
-        
-    df_pool = df_pool.sort_values(by=['Date', 'Time'])
     
-    # 步驟 3: 依序填入課綱進度
-    schedule = []
-    lesson_index = start_sequence - 1
+    schedule = pd.concat(results, ignore_index=True)
+    order = np.lexsort((schedule['Time'].astype(str).to_numpy(), schedule['Date'].to_numpy()))
+    schedule = schedule.iloc[order].reset_index(drop=True)
     
-    for _, slot_info in df_pool.iterrows():
-        # 取得教材
-        book_index = lesson_index % total_books
-        book_info = syllabus_data.iloc[book_index]
-        
-        unit_value = book_info.get('Unit', book_info.get('Chapters', ''))
-        
-        slot = {
-            'Slot_ID': str(uuid.uuid4()),
-            'CourseLineID': courseline_id,
-            'CourseName': course_name,
-            'SyllabusID': syllabus_id,
-            'SyllabusName': book_info.get('SyllabusName', ''),
-            'Date': slot_info['Date'].strftime('%Y-%m-%d'),
-            'Weekday': slot_info['Weekday_Str'],
-            'Time': slot_info['Time'],
-            'Classroom': slot_info['Classroom'],
-            'Teacher_ID': slot_info['Teacher_ID'],
-            'Level_ID': level_id,
-            'Book_Code': book_info.get('Book_Code', ''),
-            'Book_Full_Name': book_info['Book_Full_Name'],
-            'Unit': unit_value,
-            'Status': '正常',
-            'Note': '',
-            'Created_At': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'Updated_At': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+    # 各子程序的建立時間可能相差數秒，統一為同一時間
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    schedule['Created_At'] = now
+    schedule['Updated_At'] = now
+    return schedule
+
+def prepare_courselines(df_courseline):
+    """
+    取出進行中的課綱路線時段設定，並為每條路線編號
+    
+    Returns:
+    - (configs, line_of_config)：時段設定 DataFrame 與每列所屬路線的編號
+    """
+    # 只處理「進行中」的課綱路線
+    active_courselines = df_courseline[df_courseline['Status'] == '進行中']
+    
+    # 依照 CourseLineID 編號，這樣才能把週一和週三視為同一組課程
+    # 編號依 CourseLineID 排序，同日同時段的課程依此順序排列
+    active_courselines = active_courselines[active_courselines['CourseLineID'].notna()]
+    
+    # 同一路線重複的（星期, 時間）時段會產生相同的 Slot_ID，只保留第一列
+    slot_key = pd.DataFrame({
+        'CourseLineID': active_courselines['CourseLineID'].astype(str),
+        'Weekday': pd.to_numeric(active_courselines['Weekday'], errors='coerce'),
+        'Time': active_courselines['Time'].astype(str).str.strip(),
+    })
+    active_courselines = active_courselines[~slot_key.duplicated().to_numpy()]
+    
+    line_of_config, _ = pd.factorize(active_courselines['CourseLineID'], sort=True)
+    return active_courselines.reset_index(drop=True), line_of_config
+
+def first_class_dates(configs):
+    """
+    每個時段在 Start_Date 當天或之後第一次上課的日期（datetime64[D]，無法解析的日期為 NaT）
+    """
+    start_dates = pd.to_datetime(configs['Start_Date'], errors='coerce', format='mixed').to_numpy().astype('datetime64[D]')
+    target_weekdays = pd.to_numeric(configs['Weekday'], errors='coerce').fillna(1).astype(int).to_numpy() - 1
+    return start_dates + ((target_weekdays - weekday_of(start_dates)) % 7).astype('timedelta64[D]')
+
+def weeks_until(configs, until_dates):
+    """
+    每個時段從第一次上課到 until_dates（含）為止的週數，日期無效或已超過時為 0
+    """
+    first_dates = first_class_dates(configs)
+    until_dates = np.broadcast_to(np.asarray(until_dates, dtype='datetime64[D]'), (len(configs),))
+    valid = ~(np.isnat(first_dates) | np.isnat(until_dates))
+    
+    weeks = np.zeros(len(configs), dtype=np.int64)
+    weeks[valid] = (until_dates[valid] - first_dates[valid]).astype(np.int64) // 7 + 1
+    return np.maximum(weeks, 0)
+
+def extension_starts(df_schedule, today=None):
+    """
+    延長排程時每條路線的起始日期：Master_Schedule 中該路線最後一堂課的隔天
+    today: 指定時起始日期不早於 today（最後一堂課已過的路線從 today 起接續，不補排過去的課程）
+    
+    Returns:
+    - Series：{CourseLineID: Timestamp}
+    """
+    dates = pd.to_datetime(df_schedule['Date'], errors='coerce')
+    starts = dates.groupby(df_schedule['CourseLineID'].astype(str).to_numpy()).max().dropna() + pd.Timedelta(days=1)
+    if today is not None:
+        starts = starts.clip(lower=pd.Timestamp(today).normalize())
+    return starts
+
+def record_extensions(extensions, df_schedule, new_rows, fingerprints, today=None):
+    """
+    記錄延長排程新增的區段（Extend Schedule 與 nightly_extend.py 寫入 Master_Schedule 後呼叫）
+    同步時依此重新產生延長過的路線（見 expand_extensions），不從 Master_Schedule 的日期推斷
+    
+    每條路線保存延長時的指紋與區段 [起始日期, 最後日期]：
+    新區段緊接上一個區段時合併（結果相同）；從 today 起接續而留下空檔時另起一個區段；
+    路線的指紋已改變時捨棄舊的區段
+    
+    Parameters:
+    - extensions: 之前保存的區段
+    - df_schedule: 延長前的 Master_Schedule（與傳給 extend_schedules 的相同）
+    - new_rows: extend_schedules 的結果
+    - fingerprints: 目前的指紋（courseline_fingerprints 的結果）
+    - today: 與傳給 extend_schedules 的相同
+    
+    Returns:
+    - dict：{CourseLineID: {'fingerprint': ..., 'segments': [['YYYY-MM-DD', 'YYYY-MM-DD'], ...]}}
+    """
+    extensions = dict(extensions or {})
+    if new_rows is None or new_rows.empty:
+        return extensions
+    
+    starts = extension_starts(df_schedule, today)
+    ends = pd.to_datetime(new_rows['Date']).groupby(new_rows['CourseLineID'].astype(str).to_numpy()).max()
+    for courseline_id, end in ends.items():
+        start = starts[courseline_id]
+        fingerprint = fingerprints.get(courseline_id)
+        previous = extensions.get(courseline_id)
+        segments = list(previous['segments']) if previous and previous['fingerprint'] == fingerprint else []
         
-        schedule.append(slot)
-        lesson_index += 1
+        if segments and pd.Timestamp(segments[-1][1]) + pd.Timedelta(days=1) == start:
+            segments[-1] = [segments[-1][0], end.strftime('%Y-%m-%d')]
+        else:
+            segments.append([start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')])
+        extensions[courseline_id] = {'fingerprint': fingerprint, 'segments': segments}
+    return extensions
+
+def active_extensions(extensions, fingerprints):
+    """
+    只保留指紋與目前相同的路線的延長區段
+    設定（開始日期、時段、週數、課綱等）改變後的路線只重新產生一般的 weeks 週
+    """
+    return {
+        courseline_id: extension for courseline_id, extension in (extensions or {}).items()
+        if fingerprints.get(courseline_id) == extension['fingerprint']
+    }
+
+def expand_extensions(configs, line_of_config, weeks, extensions=None):
+    """
+    將延長區段展開為額外的時段設定：每個區段複製該路線的所有時段，
+    Start_Date 改為區段起始日期，週數產生到區段的最後日期（含）為止
+    
+    額外的時段附加在原時段之後，每條路線仍以原本的第一個時段作為共用設定；
+    build_schedule 依日期為整條路線編排課綱進度，所以區段接續前面的堂數，
+    產生的課程與延長時新增的相同
+    
+    Returns:
+    - (configs, line_of_config, weeks)：weeks 為每個時段的週數
+    """
+    if not extensions:
+        return configs, line_of_config, weeks
+    
+    positions, starts, untils = [], [], []
+    for position, courseline_id in enumerate(configs['CourseLineID'].astype(str)):
+        extension = extensions.get(courseline_id)
+        for start, until in (extension['segments'] if extension else ()):
+            positions.append(position)
+            starts.append(start)
+            untils.append(until)
+    if not positions:
+        return configs, line_of_config, weeks
+    
+    extra = configs.iloc[positions].copy()
+    extra['Start_Date'] = starts
+    return (
+        pd.concat([configs, extra], ignore_index=True),
+        np.r_[line_of_config, line_of_config[positions]],
+        np.r_[np.broadcast_to(weeks, (len(configs),)), weeks_until(extra, np.array(untils, dtype='datetime64[D]'))]
+    )
+
+def estimate_schedule_rows(df_courseline, weeks=12, extensions=None):
+    """
+    估計完整排程的列數（各時段週數的總和，找不到教材的路線也計入，為上限值）
+    """
+    configs, line_of_config = prepare_courselines(df_courseline)
+    configs, _, weeks = expand_extensions(configs, line_of_config, weeks, extensions)
+    return int(np.sum(np.broadcast_to(weeks, (len(configs),))))
+
+def iter_schedule_chunks(df_courseline, df_syllabus, weeks=12, chunk_rows=5000, syllabus_index=None, extensions=None):
+    """
+    串流產生排程：依 CourseLineID 順序，每次產生約 chunk_rows 列（整條路線為單位）後 yield
+    同一時間只有一批排程在記憶體中
+    相同輸入每次產生的列順序相同，寫入中斷後可依已寫入的列數續傳
+    每批內依日期、時間排序；批次之間不做全域排序
+    extensions: 延長過的路線的區段（見 expand_extensions）
+    """
+    configs, line_of_config = prepare_courselines(df_courseline)
+    if configs.empty:
+        return
+    configs, line_of_config, weeks = expand_extensions(configs, line_of_config, weeks, extensions)
+    
+    if syllabus_index is None:
+        syllabus_index = build_syllabus_index(df_syllabus)
+    
+    # 同一條路線的時段排在一起（穩定排序，保留路線內的原順序）
+    order = np.argsort(line_of_config, kind='stable')
+    configs = configs.iloc[order].reset_index(drop=True)
+    line_of_config = line_of_config[order]
+    weeks = np.broadcast_to(weeks, (len(configs),))[order]
+    rows_before = np.r_[0, np.cumsum(weeks)]
+    
+    line_starts = np.flatnonzero(np.r_[True, line_of_config[1:] != line_of_config[:-1]])
+    line_ends = np.r_[line_starts[1:], len(line_of_config)]
+    
+    chunk_start = 0
+    for line_end in line_ends:
+        if rows_before[line_end] - rows_before[chunk_start] < chunk_rows and line_end < len(line_of_config):
+            continue
         
-    return pd.DataFrame(schedule)
+        chunk_lines = line_of_config[chunk_start:line_end]
+        schedule = build_schedule(
+            configs.iloc[chunk_start:line_end].reset_index(drop=True),
+            chunk_lines - chunk_lines[0],
+            syllabus_index,
+            weeks[chunk_start:line_end]
+        )
+        chunk_start = line_end
+        if not schedule.empty:
+            yield schedule
 
-def generate_all_schedules(df_courseline, df_syllabus, weeks=12):
+def generate_all_schedules(df_courseline, df_syllabus, weeks=12, workers=1, syllabus_index=None, extensions=None):
     """
     為所有進行中的課綱路線產生排程
     [修改] 支援將相同 CourseLineID 的多個時段合併處理
+    所有路線在同一次陣列運算中完成：課綱查表只建立一次，最後只做一次全域排序
+    
+    workers > 1、主機有多個 CPU 且時段數達 PARALLEL_MIN_CONFIGS 時，分段在多個程序中產生（結果相同）
+    syllabus_index: 已建立的課綱索引，未提供時由 df_syllabus 建立
+    extensions: 延長過的路線的區段，會一併重新產生（見 expand_extensions）
     """
-    all_schedules = []
+    configs, line_of_config = prepare_courselines(df_courseline)
     
-    # 只處理「進行中」的課綱路線
-    active_courselines = df_courseline[df_courseline['Status'] == '進行中']
+    if configs.empty:
+        return pd.DataFrame()
     
-    # [關鍵修改] 依照 CourseLineID 分組，這樣才能把週一和週三視為同一組課程
-    if not active_courselines.empty:
-        grouped = active_courselines.groupby('CourseLineID')
-        
-        for courseline_id, group in grouped:
-            # 將該 ID 的所有時段設定轉為 list[dict]
-            courseline_configs = group.to_dict('records')
-            
-            # 使用新的交錯排課函式
-            schedule = generate_interleaved_schedule(courseline_configs, df_syllabus, weeks)
-            
-            if len(schedule) > 0:
-                all_schedules.append(schedule)
-    
-    if len(all_schedules) == 0:
+    if syllabus_index is None:
+        syllabus_index = build_syllabus_index(df_syllabus)
+    
+    configs, line_of_config, weeks = expand_extensions(configs, line_of_config, weeks, extensions)
+    
+    workers = min(workers, os.cpu_count() or 1)
+    if workers > 1 and len(configs) >= PARALLEL_MIN_CONFIGS and line_of_config.max() > 0:
+        try:
+            return build_schedule_parallel(configs, line_of_config, syllabus_index, weeks, workers)
+        except (OSError, BrokenProcessPool):
+            # 無法建立子程序（例如受限的執行環境）時改為單一程序
+            pass
+    
+    return build_schedule(configs, line_of_config, syllabus_index, weeks)
+
+def extend_schedules(df_courseline, df_schedule, df_syllabus, weeks=None, until=None, syllabus_index=None, today=None):
+    """
+    延長排程：接在 Master_Schedule 現有排程之後產生新的課程，不重新產生已排的部分
+    
+    每條路線從它在 Master_Schedule 中最後一堂課的隔天開始（見 extension_starts），
+    課綱進度接續該路線已排的堂數（堂數 = 該路線在 Master_Schedule 中的列數）
+    Master_Schedule 中沒有排程的路線不處理（需先同步）
+    寫入後以 record_extensions 記錄新增的區段，之後的同步才會保留這些課程
+    
+    Parameters:
+    - df_courseline: Config_CourseLine
+    - df_schedule: 目前的 Master_Schedule
+    - df_syllabus: Config_Syllabus
+    - weeks: 每個時段再延長幾週
+    - until: 延長到此日期為止（含），用於每日維持固定的排程長度；與 weeks 擇一
+        最後一堂課在 today 之前的路線從 today 起接續
+    - syllabus_index: 已建立的課綱索引
+    - today: until 模式的今天（預設為執行當天）
+    
+    Returns:
+    - DataFrame: 只包含新增的課程（欄位與 build_schedule 相同）
+    """
+    configs, line_of_config = prepare_courselines(df_courseline)
+    if configs.empty or df_schedule is None or df_schedule.empty:
+        return pd.DataFrame()
+    
+    if syllabus_index is None:
+        syllabus_index = build_syllabus_index(df_syllabus)
+    
+    existing = df_schedule.drop_duplicates(subset=['Slot_ID']) if 'Slot_ID' in df_schedule.columns else df_schedule
+    if until is not None and today is None:
+        today = pd.Timestamp.now()
+    starts = extension_starts(existing, today if until is not None else None)
+    
+    # 每條路線已排的堂數與起始日期
+    line_ids = configs['CourseLineID'].astype(str)
+    lessons = existing['CourseLineID'].astype(str).value_counts()
+    next_dates = line_ids.map(starts)
+    keep = next_dates.notna().to_numpy()
+    if not keep.any():
+        return pd.DataFrame()
+    
+    configs = configs[keep].copy()
+    line_of_config = line_of_config[keep]
+    configs['Start_Date'] = pd.to_datetime(next_dates[keep]).dt.strftime('%Y-%m-%d').to_numpy()
+    
+    # 課綱進度接續已排的堂數
+    start_sequence = configs['Start_Sequence'].astype(int) if 'Start_Sequence' in configs.columns else 1
+    configs['Start_Sequence'] = start_sequence + configs['CourseLineID'].astype(str).map(lessons).fillna(0).astype(int)
+    
+    if until is not None:
+        weeks = weeks_until(configs, np.datetime64(pd.Timestamp(until).date(), 'D'))
+    if weeks is None or not np.any(np.asarray(weeks) > 0):
         return pd.DataFrame()
     
-    # 合併所有排程
-    final_schedule = pd.concat(all_schedules, ignore_index=True)
+    line_of_config, _ = pd.factorize(line_of_config, sort=True)
+    schedule = build_schedule(configs.reset_index(drop=True), line_of_config, syllabus_index, weeks)
+    if schedule.empty:
+        return schedule
     
-    # 依日期和時間排序
-    final_schedule['Date_Sort'] = pd.to_datetime(final_schedule['Date'])
-    final_schedule = final_schedule.sort_values(['Date_Sort', 'Time']).drop('Date_Sort', axis=1)
+    # 保險：不重複新增已存在的課程
+    if 'Slot_ID' in existing.columns:
+        schedule = schedule[~schedule['Slot_ID'].isin(existing['Slot_ID'].astype(str))]
     
-    return final_schedule
+    return schedule.reset_index(drop=True)
+
+def courseline_fingerprints(df_courseline, df_syllabus, weeks=12):
+    """
+    計算每條進行中課綱路線的指紋（用於增量同步）
+    指紋涵蓋：該路線在 Config_CourseLine 的所有列（依原順序）、所引用課綱的全部教材、週數
+    任一項改變，指紋就會不同
+    
+    Returns:
+    - dict：{CourseLineID: 指紋字串}
+    """
+    active_courselines = df_courseline[df_courseline['Status'] == '進行中']
+    active_courselines = active_courselines[active_courselines['CourseLineID'].notna()]
+    
+    if active_courselines.empty:
+        return {}
+    
+    # 欄位名稱與週數也納入指紋（欄位變動時全部重新產生）
+    header = "|".join(map(str, active_courselines.columns)) + "|" + "|".join(map(str, df_syllabus.columns)) + f"|{weeks}"
+    
+    # 每個課綱的教材雜湊（依 Sequence 排序，與排課時的順序相同）
+    books = df_syllabus.sort_values(['SyllabusID', 'Sequence'], kind='stable')
+    book_hashes = pd.util.hash_pandas_object(books.astype(str), index=False).to_numpy()
+    syllabus_digests = {
+        syllabus_id: hashlib.sha1(book_hashes[positions].tobytes()).hexdigest()
+        for syllabus_id, positions in books.groupby('SyllabusID', sort=False).indices.items()
+    }
+    
+    # 每條路線的設定列雜湊（保留原順序：第一列是路線的共用設定）
+    row_hashes = pd.util.hash_pandas_object(active_courselines.astype(str), index=False).to_numpy()
+    syllabus_ids = active_courselines['SyllabusID'].to_numpy(dtype=object)
+    
+    fingerprints = {}
+    for courseline_id, positions in active_courselines.groupby('CourseLineID', sort=False).indices.items():
+        digest = hashlib.sha1(header.encode())
+        digest.update(row_hashes[positions].tobytes())
+        digest.update(syllabus_digests.get(syllabus_ids[positions[0]], "").encode())
+        fingerprints[str(courseline_id)] = digest.hexdigest()
+    
+    return fingerprints
+
+def schedule_run_id(fingerprints, extensions=None):
+    """
+    整份排程輸入的識別（由所有課綱路線的指紋與延長區段組成），用於串流寫入的續傳判斷
+    """
+    digest = hashlib.sha1()
+    for courseline_id in sorted(fingerprints):
+        digest.update(f"{courseline_id}={fingerprints[courseline_id]};".encode())
+    for courseline_id in sorted(extensions or {}):
+        digest.update(f"{courseline_id}+{extensions[courseline_id]['segments']};".encode())
+    return digest.hexdigest()
+
+def find_changed_courselines(fingerprints, previous_fingerprints, existing_ids):
+    """
+    比對指紋，找出需要重新產生與需要移除的課綱路線
+    
+    Parameters:
+    - fingerprints: 目前的指紋（courseline_fingerprints 的結果）
+    - previous_fingerprints: 上次同步成功時保存的指紋
+    - existing_ids: Master_Schedule 中已有排程的 CourseLineID
+    
+    Returns:
+    - (changed, removed)
+        changed: 指紋改變、新增，或 Master_Schedule 中沒有排程的路線
+        removed: 已不是進行中（或已刪除），但仍有排程的路線
+    """
+    changed = sorted(
+        courseline_id for courseline_id, fingerprint in fingerprints.items()
+        if previous_fingerprints.get(courseline_id) != fingerprint or courseline_id not in existing_ids
+    )
+    removed = sorted((set(previous_fingerprints) | set(existing_ids)) - set(fingerprints))
+    return changed, removed
@@ -0,0 +1,162 @@
+"""
+排程顯示資料模組
+將 Master_Schedule 整理成行事曆使用的格式（去重、日期格式、難度、老師名稱），
+並依日期建立索引，行事曆每一天只取出當天的列，不需每天掃描整張表
+不依賴 Streamlit，app.py 與 benchmark.py 共用
+"""
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+def prepare_schedule_view(df_schedule, df_courseline=None, df_teacher=None):
+    """
+    整理行事曆顯示用的排程資料
+
+    Parameters:
+    - df_schedule: Master_Schedule
+    - df_courseline: Config_CourseLine（有資料時由 Level_ID 取得難度，否則難度預設為 3）
+    - df_teacher: Config_Teacher（用來取得老師名稱）
+
+    Returns:
+    - (排程 DataFrame, 課程清單 list[dict], 移除的重複筆數)
+    """
+    # 移除重複的列（Slot_ID 由 CourseLineID + 日期 + 時間產生）
+    original_count = len(df_schedule)
+    df_schedule = df_schedule.drop_duplicates(subset=['Slot_ID'], keep='first')
+    removed = original_count - len(df_schedule)
+
+    # 統一日期格式
+    df_schedule['Date'] = pd.to_datetime(df_schedule['Date'], errors='coerce')
+    df_schedule['Date'] = df_schedule['Date'].dt.strftime('%Y-%m-%d')
+
+    # 差異同步不保證工作表的列依日期排列，這裡重新排序
+    df_schedule = df_schedule.sort_values(['Date', 'Time'], kind='stable')
+
+    if df_courseline is not None and len(df_courseline) > 0:
+        # 由 Level_ID 取得難度
+        df_schedule['Difficulty'] = df_schedule['Level_ID'].str.extract(r'(\d+)').astype(int)
+    else:
+        # 預設難度
+        df_schedule['Difficulty'] = 3
+
+    if df_teacher is not None and len(df_teacher) > 0:
+        # 合併老師名稱，沒有名稱時使用 Teacher_ID
+        df_schedule = df_schedule.merge(
+            df_teacher[['Teacher_ID', 'Teacher_Name']],
+            on='Teacher_ID',
+            how='left'
+        )
+        df_schedule['Teacher'] = df_schedule['Teacher_Name'].fillna(df_schedule['Teacher_ID'])
+    else:
+        df_schedule['Teacher'] = df_schedule['Teacher_ID']
+
+    # 整理欄位名稱（只改需要的）
+    if 'Book_Full_Name' in df_schedule.columns:
+        df_schedule = df_schedule.rename(columns={'Book_Full_Name': 'Book'})
+
+    if 'Chapters' in df_schedule.columns:
+        df_schedule = df_schedule.rename(columns={'Chapters': 'Unit'})
+
+    # 課程清單（篩選用）
+    classes = df_schedule[['CourseLineID', 'CourseName', 'Teacher', 'Difficulty']].drop_duplicates().to_dict('records')
+
+    return df_schedule, classes, removed
+
+def schedule_version(df_schedule):
+    """
+    排程資料的版本（內容雜湊），內容不變時版本相同，作為快取的鍵
+    """
+    if df_schedule is None or df_schedule.empty:
+        return "empty"
+    hashes = pd.util.hash_pandas_object(df_schedule, index=False).to_numpy()
+    digest = hashlib.sha1(hashes.tobytes())
+    digest.update(",".join(map(str, df_schedule.columns)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def build_schedule_store(df_schedule):
+    """
+    依日期分組的排程索引（每個資料版本、篩選條件只建立一次）
+    列依 (Date, Time) 排序，同一天的列是連續的區段
+
+    Returns:
+    - dict：
+        'frame': 排序後的 DataFrame
+        'records': 每列的 dict（與 frame 同順序）
+        'days': 排序後的日期字串陣列，'starts' / 'stops': 每個日期在 frame 中的區段
+        'times': 所有時間（排序後）
+    """
+    frame = df_schedule.sort_values(['Date', 'Time'], kind='stable').reset_index(drop=True)
+    dates = frame['Date'].to_numpy(dtype=object)
+
+    # 相鄰日期不同的位置就是新區段的開頭（日期字串 YYYY-MM-DD 依字串排序即依日期排序）
+    starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]]) if len(dates) > 0 else np.array([], dtype=np.int64)
+    stops = np.r_[starts[1:], len(dates)].astype(np.int64)
+    valid = np.array([isinstance(dates[start], str) for start in starts], dtype=bool)
+
+    times = frame['Time'].dropna().unique()
+
+    return {
+        'frame': frame,
+        'records': frame.to_dict('records'),
+        'days': dates[starts[valid]].astype(str),
+        'starts': starts[valid],
+        'stops': stops[valid],
+        'times': sorted(times),
+    }
+
+def day_bounds(store, first_date, last_date=None):
+    """
+    first_date 到 last_date（含，'YYYY-MM-DD'）之間的列在 frame 中的區段 (start, stop)
+    """
+    last_date = first_date if last_date is None else last_date
+    first = np.searchsorted(store['days'], first_date, side='left')
+    last = np.searchsorted(store['days'], last_date, side='right')
+    if first >= last:
+        return 0, 0
+    return int(store['starts'][first]), int(store['stops'][last - 1])
+
+def day_records(store, date_str):
+    """
+    某一天的所有課程（dict list，依時間排序）
+    """
+    start, stop = day_bounds(store, date_str)
+    return store['records'][start:stop]
+
+def day_frame(store, date_str):
+    """
+    某一天的所有課程（DataFrame，依時間排序）
+    """
+    start, stop = day_bounds(store, date_str)
+    return store['frame'].iloc[start:stop]
+
+def build_time_grid(store, dates):
+    """
+    格狀檢視（日期 × 時間，例如週行事曆）的內容，以一次 (Date, Time) groupby 完成
+
+    Parameters:
+    - store: build_schedule_store 的結果
+    - dates: 要顯示的日期字串（'YYYY-MM-DD'）
+
+    Returns:
+    - dict：
+        'times': 所有時間（排序後，與 store['times'] 相同）
+        'cells': {(日期, 時間): 課程 dict list}，沒有課的格子不會出現
+        'max_rows': {時間: 該時間在這些日期中最多的堂數}（用來統一列高）
+    """
+    grid = {'times': store['times'], 'cells': {}, 'max_rows': {time: 0 for time in store['times']}}
+    if not dates:
+        return grid
+
+    start, stop = day_bounds(store, min(dates), max(dates))
+    window = store['frame'].iloc[start:stop]
+    wanted = set(dates)
+
+    for (date, time), positions in window.groupby(['Date', 'Time'], sort=False).indices.items():
+        if date not in wanted:
+            continue
+        grid['cells'][(date, time)] = [store['records'][start + position] for position in positions]
+        grid['max_rows'][time] = max(grid['max_rows'].get(time, 0), len(positions))
+
+    return grid
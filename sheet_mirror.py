@@ -0,0 +1,194 @@
+"""
+工作表本機鏡像模組
+將每個工作表的儲存格值保存在本機 SQLite 檔案中
+讀取時立即回傳鏡像內容；內容過期時由背景執行緒向 Google Sheets 更新
+（stale-while-revalidate），伺服器重啟後也不需要等待網路讀取
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+# 正在背景更新中的工作表（避免同一工作表同時發出多個更新）
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# invalidations 表中代表「全部工作表」的名稱
+ALL_SHEETS = "*"
+
+def connect(path):
+    """
+    開啟鏡像資料庫（每次操作各自開連線，可跨執行緒使用）
+    """
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sheet_values ("
+        " sheet_name TEXT PRIMARY KEY,"
+        " sheet_values TEXT NOT NULL,"
+        " fetched_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS invalidations ("
+        " sheet_name TEXT PRIMARY KEY,"
+        " invalidated_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sync_state ("
+        " state_key TEXT PRIMARY KEY,"
+        " state_value TEXT NOT NULL)"
+    )
+    return conn
+
+def load(path, sheet_names):
+    """
+    讀取鏡像中的工作表
+    返回 dict：{工作表名稱: (儲存格值, 取得時間)}，鏡像中沒有的工作表不會出現
+    """
+    conn = connect(path)
+    try:
+        placeholders = ",".join("?" * len(sheet_names))
+        rows = conn.execute(
+            f"SELECT sheet_name, sheet_values, fetched_at FROM sheet_values WHERE sheet_name IN ({placeholders})",
+            list(sheet_names)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return {name: (json.loads(values), fetched_at) for name, values, fetched_at in rows}
+
+def store(path, sheet_values, fetched_at=None):
+    """
+    寫入（覆蓋）鏡像中的工作表
+    sheet_values: dict，{工作表名稱: 儲存格值}
+    fetched_at: 開始讀取的時間（None 表示現在）
+    讀取開始之後才被 invalidate() 的工作表（讀取期間有寫入）內容可能是寫入前的，不寫入鏡像
+    """
+    if fetched_at is None:
+        fetched_at = time.time()
+    conn = connect(path)
+    try:
+        with conn:
+            invalidated = dict(conn.execute("SELECT sheet_name, invalidated_at FROM invalidations").fetchall())
+            invalidated_all = invalidated.get(ALL_SHEETS, 0)
+            conn.executemany(
+                "INSERT OR REPLACE INTO sheet_values (sheet_name, sheet_values, fetched_at) VALUES (?, ?, ?)",
+                [
+                    (name, json.dumps(values, ensure_ascii=False), fetched_at)
+                    for name, values in sheet_values.items()
+                    if fetched_at > max(invalidated.get(name, 0), invalidated_all)
+                ]
+            )
+    finally:
+        conn.close()
+
+def invalidate(path, sheet_names=None):
+    """
+    移除鏡像中的工作表，下次讀取時會同步向 Google Sheets 取得最新資料
+    用於寫入之後，確保使用者看得到自己剛寫入的內容
+    sheet_names 為 None 時移除全部
+    同時記錄失效時間，寫入前就開始的讀取不會把舊內容存回鏡像（見 store）
+    """
+    now = time.time()
+    conn = connect(path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO invalidations (sheet_name, invalidated_at) VALUES (?, ?)",
+                [(name, now) for name in (sheet_names if sheet_names is not None else [ALL_SHEETS])]
+            )
+            if sheet_names is None:
+                conn.execute("DELETE FROM sheet_values")
+            else:
+                conn.executemany(
+                    "DELETE FROM sheet_values WHERE sheet_name = ?",
+                    [(name,) for name in sheet_names]
+                )
+    finally:
+        conn.close()
+
+def load_state(path, key, default=None):
+    """
+    讀取與工作表內容無關的本機同步狀態（例如課綱路線指紋）
+    invalidate() 不會清除這些狀態
+    """
+    conn = connect(path)
+    try:
+        row = conn.execute("SELECT state_value FROM sync_state WHERE state_key = ?", (key,)).fetchone()
+    finally:
+        conn.close()
+
+    return json.loads(row[0]) if row else default
+
+def save_state(path, key, value):
+    """
+    寫入本機同步狀態（value 需可轉為 JSON）
+    """
+    conn = connect(path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (state_key, state_value) VALUES (?, ?)",
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+    finally:
+        conn.close()
+
+def refresh_in_background(path, sheet_names, fetch):
+    """
+    在背景執行緒中重新讀取工作表並更新鏡像
+    已在更新中的工作表會略過
+    """
+    with _refreshing_lock:
+        pending = [name for name in sheet_names if name not in _refreshing]
+        _refreshing.update(pending)
+
+    if not pending:
+        return
+
+    def worker():
+        try:
+            started = time.time()
+            store(path, fetch(pending), started)
+        except Exception:
+            # 更新失敗時保留舊的鏡像內容，下次讀取會再嘗試
+            pass
+        finally:
+            with _refreshing_lock:
+                _refreshing.difference_update(pending)
+
+    threading.Thread(target=worker, name="sheet-mirror-refresh", daemon=True).start()
+
+def read(path, sheet_names, fetch, max_age):
+    """
+    讀取工作表儲存格值（stale-while-revalidate）
+
+    Parameters:
+    - path: 鏡像檔案路徑
+    - sheet_names: 要讀取的工作表名稱 list
+    - fetch: 向 Google Sheets 讀取的函式，fetch(names) -> {名稱: 儲存格值}
+    - max_age: 鏡像內容的有效秒數，超過後於背景更新
+
+    Returns:
+    - dict：{工作表名稱: 儲存格值}
+    鏡像中沒有的工作表會直接（阻塞）讀取一次
+    """
+    mirrored = load(path, sheet_names)
+
+    missing = [name for name in sheet_names if name not in mirrored]
+    fetched = {}
+    if missing:
+        started = time.time()
+        fetched = fetch(missing)
+        store(path, fetched, started)
+
+    now = time.time()
+    stale = [name for name, (_, fetched_at) in mirrored.items() if now - fetched_at > max_age]
+    if stale:
+        refresh_in_background(path, stale, fetch)
+
+    result = {}
+    for name in sheet_names:
+        result[name] = fetched[name] if name in fetched else mirrored[name][0]
+    return result
@@ -1,11 +1,124 @@
 """
 Google Sheets 資料操作模組
 負責讀取和寫入 Google Sheets 資料
+
+讀取一律經過本機鏡像（見 sheet_mirror.py）：立即回傳鏡像內容，過期時於背景更新；
+寫入後會讓對應工作表的鏡像失效，下次讀取時重新向 Google Sheets 取得
+所有 API 請求都經過 sheets_request（限流、退避重試、合併相同讀取）
 """
 
+import threading
+
 import pandas as pd
 import streamlit as st
-from config import get_spreadsheet
+from gspread.utils import absolute_range_name, numericise_all
+import sheet_mirror
+from availability import build_availability
+from config import MIRROR_MAX_AGE, MIRROR_PATH, open_connection, open_worksheet
+from schedule_generator import build_syllabus_index
+from sheets_request import execute_read, execute_write
+from virtual_schedule import build_virtual_schedule
+
+# 頁面載入時需要的工作表（由 load_all_sheets 一次批次讀取）
+BULK_SHEETS = ["Config_Syllabus", "Config_CourseLine", "Config_Teacher", "Master_Schedule"]
+
+# Master_Schedule 差異同步：以 Slot_ID 辨識同一堂課
+# （Slot_ID 由 CourseLineID + 日期 + 時間決定，見 schedule_generator.make_slot_ids）
+SCHEDULE_KEY = ['Slot_ID']
+# 每次產生都會不同的欄位，不列入內容比較
+SCHEDULE_VOLATILE = ['Created_At', 'Updated_At']
+
+# stream_master_schedule 續傳點在同步狀態中的鍵
+STREAM_CHECKPOINT = 'stream_master_schedule'
+
+# 工作表結構登錄：{工作表名稱: {'headers': 第 1 列原始表頭（含空白欄位）}}
+# 讀取工作表時填入；寫入時直接使用，不必每次先讀取表頭
+SCHEMA_REGISTRY = {}
+SCHEMA_LOCK = threading.Lock()
+
+def values_to_dataframe(values):
+    """
+    將工作表儲存格（第 1 列為表頭）轉為 DataFrame
+    與 get_all_records 相同：補齊每列長度、數字字串轉為數值
+    表頭空白的欄位會被移除
+    """
+    if not values or not values[0]:
+        return pd.DataFrame()
+    
+    width = max(len(row) for row in values)
+    headers = values[0] + [""] * (width - len(values[0]))
+    rows = [numericise_all(row + [""] * (width - len(row))) for row in values[1:]]
+    
+    # 只保留有表頭的欄位
+    keep = [i for i, h in enumerate(headers) if str(h).strip()]
+    return pd.DataFrame(
+        [[row[i] for i in keep] for row in rows],
+        columns=[headers[i] for i in keep]
+    )
+
+def register_schema(sheet_name, headers):
+    """
+    登錄工作表的欄位順序
+    """
+    with SCHEMA_LOCK:
+        SCHEMA_REGISTRY[sheet_name] = {'headers': list(headers)}
+
+def invalidate_schema(sheet_name):
+    """
+    移除登錄的工作表結構，下次寫入前會重新讀取表頭
+    """
+    with SCHEMA_LOCK:
+        SCHEMA_REGISTRY.pop(sheet_name, None)
+
+def get_sheet_headers(sheet_name, required=()):
+    """
+    取得工作表表頭（原始順序）
+    優先使用登錄的結構；required 中有欄位不在登錄的表頭內時，
+    視為工作表結構已變更，重新讀取表頭（1 次 API 請求）並更新登錄
+    """
+    with SCHEMA_LOCK:
+        schema = SCHEMA_REGISTRY.get(sheet_name)
+    
+    if schema is not None and all(col in schema['headers'] for col in required):
+        return schema['headers']
+    
+    headers = execute_read(
+        ("row_values", sheet_name, 1),
+        lambda: open_worksheet(sheet_name).row_values(1)
+    )
+    register_schema(sheet_name, headers)
+    return headers
+
+def sheet_to_dataframe(sheet_name, values):
+    """
+    將工作表儲存格轉為 DataFrame，並登錄該工作表的結構
+    """
+    df = values_to_dataframe(values)
+    register_schema(sheet_name, values[0] if values else [])
+    return df
+
+def fetch_sheet_values(sheet_names):
+    """
+    以 1 次 values:batchGet 請求向 Google Sheets 讀取多個工作表
+    返回 dict：{工作表名稱: 儲存格值（含表頭列）}
+    失敗時直接拋出例外（背景更新鏡像的執行緒也會呼叫此函式）
+    """
+    ranges = [absolute_range_name(name) for name in sheet_names]
+    response = execute_read(
+        ("values_batch_get", tuple(ranges)),
+        lambda: open_connection()["spreadsheet"].values_batch_get(ranges)
+    )
+    
+    # valueRanges 的順序與請求的 ranges 相同
+    value_ranges = response.get('valueRanges', [])
+    return {name: value_range.get('values', []) for name, value_range in zip(sheet_names, value_ranges)}
+
+def read_sheet_values(sheet_names):
+    """
+    讀取工作表儲存格值
+    優先回傳本機鏡像內容，過期時於背景更新；鏡像中沒有時才同步讀取
+    """
+    return sheet_mirror.read(MIRROR_PATH, sheet_names, fetch_sheet_values, MIRROR_MAX_AGE)
 
 @st.cache_data(ttl=60)
 def load_config_syllabus():
@@ -14,24 +127,9 @@ def load_config_syllabus():
     返回 DataFrame
     """
     try:
-        spreadsheet = get_spreadsheet()
-        if not spreadsheet:
-            return None
-        
-        worksheet = spreadsheet.worksheet("Config_Syllabus")
-        
-        # 先取得原始表頭
-        raw_headers = worksheet.row_values(1)
-        
-        # 過濾空白欄位，建立乾淨的表頭對照
-        clean_headers = [h if h.strip() else f"_empty_{i}" for i, h in enumerate(raw_headers)]
-        
-        # 使用自訂表頭讀取資料
-        data = worksheet.get_all_records(expected_headers=clean_headers)
-        df = pd.DataFrame(data)
-        
-        # 移除空白欄位
-        df = df[[col for col in df.columns if not col.startswith('_empty_')]]
+        # 表頭與資料一次讀取，並移除空白欄位
+        values = read_sheet_values(["Config_Syllabus"])["Config_Syllabus"]
+        df = sheet_to_dataframe("Config_Syllabus", values)
         
         return df
     
@@ -46,21 +144,9 @@ def load_config_courseline():
     返回 DataFrame
     """
     try:
-        spreadsheet = get_spreadsheet()
-        if not spreadsheet:
-            return None
-        
-        worksheet = spreadsheet.worksheet("Config_CourseLine")
-        
-        # 先取得原始表頭，過濾空白欄位
-        raw_headers = worksheet.row_values(1)
-        clean_headers = [h if h.strip() else f"_empty_{i}" for i, h in enumerate(raw_headers)]
-        
-        data = worksheet.get_all_records(expected_headers=clean_headers)
-        df = pd.DataFrame(data)
-        
-        # 移除空白欄位
-        df = df[[col for col in df.columns if not col.startswith('_empty_')]]
+        # 表頭與資料一次讀取，並移除空白欄位
+        values = read_sheet_values(["Config_CourseLine"])["Config_CourseLine"]
+        df = sheet_to_dataframe("Config_CourseLine", values)
         
         return df
     
@@ -75,21 +161,9 @@ def load_config_teacher():
     返回 DataFrame
     """
     try:
-        spreadsheet = get_spreadsheet()
-        if not spreadsheet:
-            return None
-        
-        worksheet = spreadsheet.worksheet("Config_Teacher")
-        
-        # 先取得原始表頭，過濾空白欄位
-        raw_headers = worksheet.row_values(1)
-        clean_headers = [h if h.strip() else f"_empty_{i}" for i, h in enumerate(raw_headers)]
-        
-        data = worksheet.get_all_records(expected_headers=clean_headers)
-        df = pd.DataFrame(data)
-        
-        # 移除空白欄位
-        df = df[[col for col in df.columns if not col.startswith('_empty_')]]
+        # 表頭與資料一次讀取，並移除空白欄位
+        values = read_sheet_values(["Config_Teacher"])["Config_Teacher"]
+        df = sheet_to_dataframe("Config_Teacher", values)
         
         return df
     
@@ -104,21 +178,9 @@ def load_master_schedule():
     返回 DataFrame
     """
     try:
-        spreadsheet = get_spreadsheet()
-        if not spreadsheet:
-            return None
-        
-        worksheet = spreadsheet.worksheet("Master_Schedule")
-        
-        # 先取得原始表頭，過濾空白欄位
-        raw_headers = worksheet.row_values(1)
-        clean_headers = [h if h.strip() else f"_empty_{i}" for i, h in enumerate(raw_headers)]
-        
-        data = worksheet.get_all_records(expected_headers=clean_headers)
-        df = pd.DataFrame(data)
-        
-        # 移除空白欄位
-        df = df[[col for col in df.columns if not col.startswith('_empty_')]]
+        # 表頭與資料一次讀取，並移除空白欄位
+        values = read_sheet_values(["Master_Schedule"])["Master_Schedule"]
+        df = sheet_to_dataframe("Master_Schedule", values)
         
         # 確保日期格式正確
         if not df.empty and 'Date' in df.columns:
@@ -130,6 +192,67 @@ def load_master_schedule():
         st.error(f"❌ 讀取 Master_Schedule 失敗: {str(e)}")
         return None
 
+@st.cache_data(ttl=30)
+def load_all_sheets():
+    """
+    一次讀取 BULK_SHEETS 中的所有工作表（需要連線時只發出 1 次 values:batchGet 請求）
+    取代分別呼叫 load_config_* / load_master_schedule
+    返回 dict：{工作表名稱: DataFrame}，清理方式與各別讀取函式相同
+    """
+    try:
+        sheet_values = read_sheet_values(BULK_SHEETS)
+        sheets = {name: sheet_to_dataframe(name, sheet_values[name]) for name in BULK_SHEETS}
+        
+        # 確保日期格式正確（與 load_master_schedule 相同）
+        df_schedule = sheets['Master_Schedule']
+        if not df_schedule.empty and 'Date' in df_schedule.columns:
+            df_schedule['Date'] = pd.to_datetime(df_schedule['Date'], errors='coerce')
+        
+        return sheets
+    
+    except Exception as e:
+        st.error(f"❌ 批次讀取工作表失敗: {str(e)}")
+        return None
+
+@st.cache_data(ttl=30)
+def load_syllabus_index():
+    """
+    建立 Config_Syllabus 的課綱索引（見 schedule_generator.build_syllabus_index）
+    與 load_all_sheets 共用同一份資料，每次載入只建立一次
+    返回 dict，讀取失敗時返回 None
+    """
+    sheets = load_all_sheets()
+    if sheets is None:
+        return None
+    
+    return build_syllabus_index(sheets['Config_Syllabus'])
+
+@st.cache_data(ttl=30)
+def load_availability():
+    """
+    建立老師與教室的可用時段索引（見 availability.build_availability）
+    與 load_all_sheets 共用同一份資料，每次載入只建立一次
+    返回 dict，讀取失敗時返回 None
+    """
+    sheets = load_all_sheets()
+    if sheets is None:
+        return None
+    
+    return build_availability(sheets['Config_CourseLine'], sheets['Config_Teacher'])
+
+@st.cache_data(ttl=30)
+def load_virtual_schedule():
+    """
+    建立虛擬排程（見 virtual_schedule.build_virtual_schedule）
+    可直接查詢任一天的課程，不需讀取或產生 Master_Schedule 的列
+    返回 dict，讀取失敗時返回 None
+    """
+    sheets = load_all_sheets()
+    if sheets is None:
+        return None
+    
+    return build_virtual_schedule(sheets['Config_CourseLine'], load_syllabus_index())
+
 @st.cache_data(ttl=30)
 def load_lesson_log():
     """
@@ -137,13 +260,8 @@ def load_lesson_log():
     返回 DataFrame
     """
     try:
-        spreadsheet = get_spreadsheet()
-        if not spreadsheet:
-            return None
-        
-        worksheet = spreadsheet.worksheet("Lesson_Log")
-        data = worksheet.get_all_records()
-        df = pd.DataFrame(data)
+        values = read_sheet_values(["Lesson_Log"])["Lesson_Log"]
+        df = sheet_to_dataframe("Lesson_Log", values)
         
         return df
     
@@ -159,22 +277,21 @@ def write_master_schedule(df):
     優化：使用批次寫入減少 API 請求次數
     """
     try:
-        spreadsheet = get_spreadsheet()
-        if not spreadsheet:
-            return False
-        
-        worksheet = spreadsheet.worksheet("Master_Schedule")
-        
-        # 清空工作表
-        worksheet.clear()
-        
         # 準備資料（表頭 + 資料）
         headers = df.columns.tolist()
         data_rows = df.values.tolist()
         all_data = [headers] + data_rows
         
+        # 清空工作表（中斷的串流寫入不再能續傳）
+        drop_stream_checkpoint()
+        execute_write(lambda: open_worksheet("Master_Schedule").clear())
+        
         # 批次寫入（1 次 API 請求）
-        worksheet.append_rows(all_data)
+        execute_write(lambda: open_worksheet("Master_Schedule").append_rows(all_data), idempotent=False)
+        register_schema("Master_Schedule", headers)
+        
+        # 鏡像失效，下次讀取會取得剛寫入的資料
+        sheet_mirror.invalidate(MIRROR_PATH, ["Master_Schedule"])
         
         st.success("✅ Master_Schedule 更新成功")
         return True
@@ -183,6 +300,240 @@ def write_master_schedule(df):
         st.error(f"❌ 寫入 Master_Schedule 失敗: {str(e)}")
         return False
 
+def stream_master_schedule(chunks, run_id):
+    """
+    以串流方式完全覆寫 Master_Schedule：每收到一批排程就追加寫入，不需要整份排程在記憶體中
+    用於排程列數很多的「同步所有課綱路線」
+
+    Parameters:
+    - chunks: 依固定順序產生排程 DataFrame 的 iterator（見 schedule_generator.iter_schedule_chunks）
+    - run_id: 本次輸入的識別（例如課綱路線指紋的雜湊）
+
+    中斷時保留續傳點（run_id 與已寫入的列數，每批寫入後更新）：
+    下次以相同 run_id 呼叫、且工作表的列數與續傳點相符時，不清空工作表，略過已寫入的列從中斷處繼續；
+    列數不符（例如最後一批是否寫入不明確，或其他寫入者改動過工作表）時清空重寫
+    API 請求：清空 1 次 + 每批追加 1 次（有續傳點時另讀取 A 欄 1 次）
+    """
+    checkpoint = load_sync_state(STREAM_CHECKPOINT) or {}
+    
+    try:
+        resuming = False
+        if checkpoint.get('run_id') == run_id:
+            # A 欄為 Slot_ID，每列都有值（含表頭）
+            column_values = execute_read(
+                ("col_values", "Master_Schedule", 1),
+                lambda: open_worksheet("Master_Schedule").col_values(1)
+            )
+            resuming = len(column_values) == checkpoint.get('rows')
+        
+        if resuming:
+            sheet_rows = checkpoint['rows']
+        else:
+            execute_write(lambda: open_worksheet("Master_Schedule").clear())
+            sheet_rows = 0
+            save_sync_state(STREAM_CHECKPOINT, {'run_id': run_id, 'rows': sheet_rows})
+        
+        written = max(sheet_rows - 1, 0)
+        header_written = sheet_rows > 0
+        skip = written
+        headers = None
+        for chunk in chunks:
+            headers = chunk.columns.tolist()
+            if skip >= len(chunk):
+                skip -= len(chunk)
+                continue
+            
+            data_rows = chunk.iloc[skip:].values.tolist()
+            skip = 0
+            rows = data_rows if header_written else [headers] + data_rows
+            
+            execute_write(lambda: open_worksheet("Master_Schedule").append_rows(rows), idempotent=False)
+            header_written = True
+            written += len(data_rows)
+            sheet_rows += len(rows)
+            save_sync_state(STREAM_CHECKPOINT, {'run_id': run_id, 'rows': sheet_rows})
+        
+        # 完成：清除續傳點
+        drop_stream_checkpoint()
+        if headers is not None:
+            register_schema("Master_Schedule", headers)
+        
+        sheet_mirror.invalidate(MIRROR_PATH, ["Master_Schedule"])
+        
+        st.success(f"✅ Master_Schedule 更新成功（{written} 筆）")
+        return True
+    
+    except Exception as e:
+        sheet_mirror.invalidate(MIRROR_PATH, ["Master_Schedule"])
+        st.error(f"❌ 寫入 Master_Schedule 中斷: {str(e)}（已寫入的部分會保留，再次同步時從中斷處繼續）")
+        return False
+
+def plan_schedule_sync(current_values, df, scope=None):
+    """
+    比對 Master_Schedule 現有內容與新排程，規劃最少的寫入動作
+    以 SCHEDULE_KEY 為鍵比對；SCHEDULE_VOLATILE 欄位不列入比較，
+    現有列的 Created_At 會被保留
+
+    Parameters:
+    - current_values: 工作表目前的儲存格值（含表頭列）
+    - df: 新的排程 DataFrame
+    - scope: 本次重新產生的 CourseLineID 集合（None 表示 df 為完整排程）
+        不在 scope 內的現有列視為不變，不會被刪除或改寫
+
+    Returns:
+    - dict，包含：
+        updates: [(資料列索引, 列值)]，覆寫既有位置（已更新的列、補到刪除空位的新列）
+        appends: [列值]，接在最後面的新列
+        clear_from / clear_to: 需要清空的資料列索引範圍（刪除多於新增時）
+        inserted / updated / deleted: 各類變動筆數
+    - 表頭與 DataFrame 欄位不一致時返回 None（應改用完全覆寫）
+    """
+    headers = df.columns.tolist()
+    if not current_values or current_values[0] != headers:
+        return None
+    
+    if scope is not None and 'CourseLineID' not in headers:
+        return None
+    
+    width = len(headers)
+    key_idx = [headers.index(col) for col in SCHEDULE_KEY]
+    compare_idx = [i for i, col in enumerate(headers) if col not in SCHEDULE_VOLATILE]
+    keep_idx = [headers.index(col) for col in ('Created_At',) if col in headers]
+    
+    def as_text(value):
+        return "" if value is None else str(value)
+    
+    existing = [row + [""] * (width - len(row)) for row in current_values[1:]]
+    
+    # 鍵值 -> 現有資料列索引（重複的鍵依序配對，多出的視為刪除）
+    positions = {}
+    for i, row in enumerate(existing):
+        positions.setdefault(tuple(row[k] for k in key_idx), []).append(i)
+    
+    changed = {}      # 資料列索引 -> 新列值
+    inserts = []
+    matched = set()
+    
+    # 部分同步：範圍外的課綱路線保持原樣
+    if scope is not None:
+        scope_text = {as_text(courseline_id) for courseline_id in scope}
+        line_idx = headers.index('CourseLineID')
+        matched.update(i for i, row in enumerate(existing) if row[line_idx] not in scope_text)
+    
+    for row in df.values.tolist():
+        key = tuple(as_text(row[k]) for k in key_idx)
+        candidates = positions.get(key)
+        if not candidates:
+            inserts.append(row)
+            continue
+        
+        i = candidates.pop(0)
+        matched.add(i)
+        if all(as_text(row[c]) == existing[i][c] for c in compare_idx):
+            continue
+        
+        # 內容有變動：保留原本的建立時間
+        for c in keep_idx:
+            row[c] = existing[i][c]
+        changed[i] = row
+    
+    holes = [i for i in range(len(existing)) if i not in matched]
+    updated = len(changed)
+    
+    # 新列優先填入刪除後留下的空位，其餘接在最後
+    for i, row in zip(holes, inserts):
+        changed[i] = row
+    appends = inserts[len(holes):]
+    holes = holes[len(inserts):]
+    
+    # 刪除多於新增：把尾端保留的列搬進前面的空位，再清空尾端
+    clear_from = clear_to = None
+    if holes:
+        final_length = len(existing) - len(holes)
+        hole_set = set(holes)
+        tail_rows = [i for i in range(final_length, len(existing)) if i not in hole_set]
+        front_holes = [i for i in holes if i < final_length]
+        for hole, source in zip(front_holes, tail_rows):
+            changed[hole] = changed.pop(source, existing[source])
+        for i in range(final_length, len(existing)):
+            changed.pop(i, None)
+        clear_from, clear_to = final_length, len(existing) - 1
+    
+    return {
+        'updates': sorted(changed.items()),
+        'appends': appends,
+        'clear_from': clear_from,
+        'clear_to': clear_to,
+        'inserted': len(inserts),
+        'updated': updated,
+        'deleted': len(existing) - len(matched),
+    }
+
+def sync_master_schedule(df, scope=None):
+    """
+    以差異方式同步 Master_Schedule 工作表
+    只寫入新增、更新、刪除的列，不先清空工作表（讀取者不會看到空白的工作表）
+    用於「同步所有課綱路線」按鈕
+    API 請求：讀取 1 次 + 覆寫 1 次 + 追加 1 次 + 清空尾端 1 次（沒有變動的部分會略過）
+    表頭與新排程欄位不一致時，改用 write_master_schedule 完全覆寫
+    
+    scope: 本次重新產生的 CourseLineID 集合，只同步這些路線的列（見 plan_schedule_sync）
+    部分同步時表頭不一致則不寫入並返回 False（需改用完整同步）
+    """
+    try:
+        # 以工作表目前的實際內容比對（不使用鏡像）
+        current_values = execute_read(
+            ("get_all_values", "Master_Schedule"),
+            lambda: open_worksheet("Master_Schedule").get_all_values()
+        )
+        if current_values:
+            register_schema("Master_Schedule", current_values[0])
+            if scope is not None and df.empty:
+                # 只有移除的路線：以現有表頭比對
+                df = pd.DataFrame(columns=current_values[0])
+        plan = plan_schedule_sync(current_values, df, scope)
+        if plan is None:
+            if scope is not None:
+                st.warning("⚠️ Master_Schedule 表頭與排程欄位不一致，無法部分同步")
+                return False
+            return write_master_schedule(df)
+        
+        # 接下來會改動工作表，中斷的串流寫入不再能續傳
+        drop_stream_checkpoint()
+        
+        # 連續的列合併為同一個範圍，1 次 batch_update 寫入
+        data = []
+        for i, row in plan['updates']:
+            sheet_row = i + 2  # 第 1 列為表頭
+            if data and data[-1]['end'] == sheet_row - 1:
+                data[-1]['values'].append(row)
+                data[-1]['end'] = sheet_row
+            else:
+                data.append({'start': sheet_row, 'end': sheet_row, 'values': [row]})
+        
+        if data:
+            ranges = [{'range': f"A{d['start']}", 'values': d['values']} for d in data]
+            execute_write(lambda: open_worksheet("Master_Schedule").batch_update(ranges))
+        
+        if plan['appends']:
+            execute_write(lambda: open_worksheet("Master_Schedule").append_rows(plan['appends']), idempotent=False)
+        
+        if plan['clear_from'] is not None:
+            clear_range = f"{plan['clear_from'] + 2}:{plan['clear_to'] + 2}"
+            execute_write(lambda: open_worksheet("Master_Schedule").batch_clear([clear_range]))
+        
+        # 鏡像失效，下次讀取會取得剛寫入的資料
+        sheet_mirror.invalidate(MIRROR_PATH, ["Master_Schedule"])
+        
+        st.success(
+            f"✅ Master_Schedule 同步完成（新增 {plan['inserted']}、更新 {plan['updated']}、刪除 {plan['deleted']} 筆）"
+        )
+        return True
+    
+    except Exception as e:
+        st.error(f"❌ 同步 Master_Schedule 失敗: {str(e)}")
+        return False
+
 def append_master_schedule(df):
     """
     追加課程至 Master_Schedule 工作表
@@ -191,14 +542,8 @@ def append_master_schedule(df):
     優化：使用批次寫入減少 API 請求次數
     """
     try:
-        spreadsheet = get_spreadsheet()
-        if not spreadsheet:
-            return False
-        
-        worksheet = spreadsheet.worksheet("Master_Schedule")
-        
-        # 取得表頭
-        headers = worksheet.row_values(1)
+        # 取得表頭（使用登錄的結構，欄位對不上時才重新讀取）
+        headers = get_sheet_headers("Master_Schedule", required=df.columns)
         
         # 確保 DataFrame 欄位順序與 Google Sheets 表頭一致
         df_ordered = df[headers] if all(col in df.columns for col in headers) else df
@@ -206,13 +551,19 @@ def append_master_schedule(df):
         # 準備資料
         data_rows = df_ordered.values.tolist()
         
-        # 批次追加（1 次 API 請求）
-        worksheet.append_rows(data_rows)
+        # 批次追加（1 次 API 請求），中斷的串流寫入不再能續傳
+        drop_stream_checkpoint()
+        execute_write(lambda: open_worksheet("Master_Schedule").append_rows(data_rows), idempotent=False)
+        
+        # 鏡像失效，下次讀取會取得剛寫入的資料
+        sheet_mirror.invalidate(MIRROR_PATH, ["Master_Schedule"])
         
         st.success(f"✅ 成功新增 {len(df)} 筆課程")
         return True
     
     except Exception as e:
+        # 寫入失敗可能是工作表結構已變更，下次寫入前重新讀取表頭
+        invalidate_schema("Master_Schedule")
         st.error(f"❌ 追加 Master_Schedule 失敗: {str(e)}")
         return False
 
@@ -222,25 +573,24 @@ def append_lesson_log(log_data):
     log_data: dict，包含所有欄位
     """
     try:
-        spreadsheet = get_spreadsheet()
-        if not spreadsheet:
-            return False
-        
-        worksheet = spreadsheet.worksheet("Lesson_Log")
-        
-        # 取得表頭
-        headers = worksheet.row_values(1)
+        # 取得表頭（使用登錄的結構，欄位對不上時才重新讀取）
+        headers = get_sheet_headers("Lesson_Log", required=log_data.keys())
         
         # 依照表頭順序建立資料列
         row_data = [log_data.get(header, "") for header in headers]
         
         # 新增資料
-        worksheet.append_row(row_data)
+        execute_write(lambda: open_worksheet("Lesson_Log").append_row(row_data), idempotent=False)
+        
+        # 鏡像失效，下次讀取會取得剛寫入的資料
+        sheet_mirror.invalidate(MIRROR_PATH, ["Lesson_Log"])
         
         st.success("✅ 講師回填記錄已儲存")
         return True
     
     except Exception as e:
+        # 寫入失敗可能是工作表結構已變更，下次寫入前重新讀取表頭
+        invalidate_schema("Lesson_Log")
         st.error(f"❌ 新增 Lesson_Log 失敗: {str(e)}")
         return False
 
@@ -250,30 +600,55 @@ def append_courseline(courseline_data):
     courseline_data: dict，包含所有欄位
     """
     try:
-        spreadsheet = get_spreadsheet()
-        if not spreadsheet:
-            return False
-        
-        worksheet = spreadsheet.worksheet("Config_CourseLine")
-        
-        # 取得表頭
-        headers = worksheet.row_values(1)
+        # 取得表頭（使用登錄的結構，欄位對不上時才重新讀取）
+        headers = get_sheet_headers("Config_CourseLine", required=courseline_data.keys())
         
         # 依照表頭順序建立資料列
         row_data = [courseline_data.get(header, "") for header in headers]
         
         # 新增資料
-        worksheet.append_row(row_data)
+        execute_write(lambda: open_worksheet("Config_CourseLine").append_row(row_data), idempotent=False)
+        
+        # 鏡像失效，下次讀取會取得剛寫入的資料
+        sheet_mirror.invalidate(MIRROR_PATH, ["Config_CourseLine"])
         
         st.success("✅ 課綱路線建立成功")
         return True
     
     except Exception as e:
+        # 寫入失敗可能是工作表結構已變更，下次寫入前重新讀取表頭
+        invalidate_schema("Config_CourseLine")
         st.error(f"❌ 新增課綱路線失敗: {str(e)}")
         return False
 
+def load_sync_state(key, default=None):
+    """
+    讀取本機保存的同步狀態（例如上次同步時的課綱路線指紋）
+    """
+    try:
+        return sheet_mirror.load_state(MIRROR_PATH, key, default)
+    except Exception:
+        return default
+
+def save_sync_state(key, value):
+    """
+    保存本機同步狀態，失敗時只略過（下次同步會改為完整同步）
+    """
+    try:
+        sheet_mirror.save_state(MIRROR_PATH, key, value)
+    except Exception as e:
+        st.warning(f"⚠️ 無法保存同步狀態: {str(e)}")
+
+def drop_stream_checkpoint():
+    """
+    清除 stream_master_schedule 的續傳點
+    其他寫入者改動 Master_Schedule 之後，已寫入的列數不再可信，下次串流同步需清空重寫
+    """
+    save_sync_state(STREAM_CHECKPOINT, {})
+
 def clear_cache():
     """
-    清除所有快取，強制重新載入資料
+    清除所有快取（含本機鏡像），強制重新載入資料
     """
+    sheet_mirror.invalidate(MIRROR_PATH)
     st.cache_data.clear()
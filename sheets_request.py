@@ -0,0 +1,154 @@
+"""
+Google Sheets 請求排程模組
+所有對 Google Sheets 的讀寫都經過這裡：
+- Token bucket 限流：依每分鐘配額平均發出請求，超量時短暫等待而不是直接失敗
+- 429 / 5xx / 連線錯誤時以指數退避（含 jitter）重試
+- 同時進行中的相同讀取請求合併為一次
+"""
+
+import random
+import threading
+import time
+
+import requests
+from google.auth.exceptions import RefreshError, TransportError
+
+from config import (
+    READ_REQUESTS_PER_MINUTE,
+    REQUEST_BACKOFF_BASE,
+    REQUEST_BACKOFF_MAX,
+    REQUEST_MAX_RETRIES,
+    WRITE_REQUESTS_PER_MINUTE,
+    is_stale_connection_error,
+    reset_connection,
+)
+
+# 可重試的 HTTP 狀態碼（配額用盡、伺服器暫時錯誤）
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Token bucket 限流器
+    容量為每分鐘配額（允許短時間爆量），之後以平均速率補充
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        取得 1 個 token，不足時等待到補充為止
+        返回等待的秒數
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+# 整個程序共用（所有使用者 session 共用同一個 Service Account 配額）
+read_bucket = TokenBucket(READ_REQUESTS_PER_MINUTE)
+write_bucket = TokenBucket(WRITE_REQUESTS_PER_MINUTE)
+
+# 進行中的讀取請求：key -> {"event", "result", "error"}
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def is_retryable_error(e):
+    """
+    判斷例外是否值得重試（配額、伺服器暫時錯誤、連線問題）
+    """
+    if is_stale_connection_error(e):
+        return True
+    if isinstance(e, (requests.exceptions.Timeout, TransportError)):
+        return True
+    code = getattr(e, "code", None)
+    return code in RETRYABLE_STATUS
+
+def is_rejected_request(e):
+    """
+    判斷例外是否代表請求確定沒有被 Google Sheets 執行（配額 429、授權失敗）
+    非冪等的寫入（append）只在這些情況重試；5xx、逾時、連線中斷時可能已經寫入
+    """
+    if isinstance(e, RefreshError):
+        return True
+    code = getattr(e, "code", None)
+    return code in (401, 429)
+
+def backoff_delay(attempt):
+    """
+    第 attempt 次重試前的等待秒數（指數退避 + full jitter）
+    """
+    return random.uniform(0, min(REQUEST_BACKOFF_MAX, REQUEST_BACKOFF_BASE * (2 ** attempt)))
+
+def run_with_retry(fn, bucket, idempotent=True):
+    """
+    依配額取得 token 後執行 fn，可重試的錯誤以指數退避重試
+    連線失效時先重置共用連線，fn 重試時會重新建立
+    idempotent 為 False 時只重試確定沒有被執行的請求（見 is_rejected_request）
+    """
+    attempt = 0
+    while True:
+        bucket.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= REQUEST_MAX_RETRIES or not is_retryable_error(e):
+                raise
+            if not idempotent and not is_rejected_request(e):
+                raise
+            if is_stale_connection_error(e):
+                reset_connection()
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+def execute_read(key, fn):
+    """
+    執行讀取請求
+    key 相同且正在進行中的請求會等待並共用同一個結果，不會重複呼叫 API
+
+    Parameters:
+    - key: 可雜湊的請求識別（例如 ("values", ("Config_Syllabus",))）
+    - fn: 實際發出請求的函式（無參數）
+    """
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = {"event": threading.Event(), "result": None, "error": None}
+            _inflight[key] = call
+
+    if not leader:
+        call["event"].wait()
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+    try:
+        call["result"] = run_with_retry(fn, read_bucket)
+        return call["result"]
+    except Exception as e:
+        call["error"] = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call["event"].set()
+
+def execute_write(fn, idempotent=True):
+    """
+    執行寫入請求（寫入不合併，每次都會送出）
+    idempotent: 重送是否安全。append 重送會新增重複的列，需傳 False
+    """
+    return run_with_retry(fn, write_bucket, idempotent)
@@ -0,0 +1,116 @@
+"""
+「Sync All Course Lines」按鈕的測試（使用本機 SQLite 後端，不需連線）
+
+執行：python -m pytest test_sync.py
+"""
+
+import pandas as pd
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import config
+import sheets_handler
+from benchmark import synthetic_data
+from schedule_generator import courseline_fingerprints
+
+SYNC_BUTTON = "🔄 Sync All Course Lines"
+EXTEND_BUTTON = "⏩ Extend Schedule"
+
+@pytest.fixture
+def local_sheets(tmp_path, monkeypatch):
+    """
+    切換到暫存目錄中的本機後端與鏡像，返回本機 Spreadsheet
+    """
+    monkeypatch.setattr(config, "STORAGE_BACKEND", "local")
+    monkeypatch.setattr(config, "LOCAL_SHEETS_PATH", str(tmp_path / "sheets.sqlite3"))
+    monkeypatch.setattr(config, "LOCAL_SHEETS_LATENCY", 0.0)
+    monkeypatch.setattr(sheets_handler, "MIRROR_PATH", str(tmp_path / "mirror.sqlite3"))
+    config.reset_connection()
+    st.cache_data.clear()
+
+    yield config.open_connection()["spreadsheet"]
+
+    config.reset_connection()
+    st.cache_data.clear()
+
+def as_values(df):
+    return [list(df.columns)] + df.astype(str).values.tolist()
+
+def click_sidebar_button(at, label):
+    at.run()
+    labels = [button.label for button in at.sidebar.button]
+    at.sidebar.button[labels.index(label)].click()
+    at.run()
+
+def click_sync(at):
+    click_sidebar_button(at, SYNC_BUTTON)
+
+def read_schedule(spreadsheet):
+    values = spreadsheet.worksheet("Master_Schedule").get_all_values()
+    return pd.DataFrame(values[1:], columns=values[0])
+
+def test_sync_with_empty_schedule_and_saved_fingerprints(local_sheets):
+    """
+    Master_Schedule 沒有任何列（也沒有表頭），但保存了上次同步的指紋：
+    不可因找不到 CourseLineID 欄位而中斷，應改為完整同步
+    """
+    df_courseline, df_syllabus, df_teacher = synthetic_data(30, seed=1)
+    local_sheets.import_sheets({
+        "Config_CourseLine": as_values(df_courseline),
+        "Config_Syllabus": as_values(df_syllabus),
+        "Config_Teacher": as_values(df_teacher),
+    })
+    sheets_handler.save_sync_state(
+        "courseline_fingerprints",
+        courseline_fingerprints(df_courseline, df_syllabus, weeks=12)
+    )
+
+    at = AppTest.from_file("app.py", default_timeout=60)
+    click_sync(at)
+
+    assert not at.exception
+    schedule = read_schedule(local_sheets)
+    active_ids = set(df_courseline.loc[df_courseline["Status"] == "進行中", "CourseLineID"])
+    assert len(schedule) > 0
+    assert set(schedule["CourseLineID"]) == active_ids
+
+def test_sync_regenerates_recorded_extensions_until_config_changes(local_sheets):
+    """
+    Extend Schedule 新增的課程在完整同步後保留（依記錄的區段重新產生）；
+    路線的設定改變後只重新產生 12 週，不從 Master_Schedule 的最後日期推斷延長
+    """
+    df_courseline, df_syllabus, df_teacher = synthetic_data(30, seed=2)
+    local_sheets.import_sheets({
+        "Config_CourseLine": as_values(df_courseline),
+        "Config_Syllabus": as_values(df_syllabus),
+        "Config_Teacher": as_values(df_teacher),
+    })
+
+    at = AppTest.from_file("app.py", default_timeout=60)
+    click_sync(at)
+    synced = read_schedule(local_sheets)
+    click_sidebar_button(at, EXTEND_BUTTON)
+    extended = read_schedule(local_sheets)
+    assert len(extended) > len(synced)
+
+    # 沒有保存的指紋時完整重新產生
+    sheets_handler.save_sync_state("courseline_fingerprints", {})
+    click_sync(at)
+    assert not at.exception
+    assert set(read_schedule(local_sheets)["Slot_ID"]) == set(extended["Slot_ID"])
+
+    # 將一條延長過的路線的 Start_Date 提前 14 天
+    courseline_id = extended["CourseLineID"].iloc[0]
+    moved = df_courseline["CourseLineID"] == courseline_id
+    df_courseline.loc[moved, "Start_Date"] = (
+        pd.to_datetime(df_courseline.loc[moved, "Start_Date"]) - pd.Timedelta(days=14)
+    ).dt.strftime("%Y-%m-%d")
+    local_sheets.import_sheets({"Config_CourseLine": as_values(df_courseline)})
+    sheets_handler.clear_cache()
+    click_sync(at)
+
+    schedule = read_schedule(local_sheets)
+    assert (schedule["CourseLineID"] == courseline_id).sum() == 12 * moved.sum()
+    others = schedule[schedule["CourseLineID"] != courseline_id]
+    assert set(others["Slot_ID"]) == set(extended.loc[extended["CourseLineID"] != courseline_id, "Slot_ID"])
@@ -7,15 +7,18 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from sheets_handler import (
-    load_config_syllabus, 
-    load_config_teacher, 
-    load_config_courseline,
+    load_all_sheets,
+    load_syllabus_index,
+    load_availability,
     append_courseline,
     write_master_schedule,
     clear_cache
 )
 # [修改] 引用新的交錯排課函式
-from schedule_generator import generate_interleaved_schedule
+from schedule_generator import generate_interleaved_schedule, syllabus_books
+from schedule_conflicts import find_conflicts
+from classroom_allocator import allocate_classrooms, build_occupancy
+from availability import free_resources
 
 def generate_courseline_id(existing_courselines):
     """
@@ -41,26 +44,101 @@ def generate_courseline_id(existing_courselines):
     next_num = max(numbers) + 1
     return f"C{next_num:03d}"
 
-def auto_assign_classroom(df_courseline, weekday, time):
+def auto_assign_classrooms(df_courseline, time_slots):
     """
-    Automatically assign classroom based on concurrent courses
+    Automatically assign the first free classroom (A, B, C, D...) to every time slot of one submit
+    Only active course lines occupy a classroom; all slots are allocated in one pass,
+    so two slots at the same weekday and time never get the same room.
+    Returns a list of rooms in time_slots order.
     """
-    if df_courseline is None or len(df_courseline) == 0:
-        return "A"
+    df_slots = pd.DataFrame({
+        'Weekday': [slot['weekday'] for slot in time_slots],
+        'Time': [slot['time'] for slot in time_slots],
+    })
+    return allocate_classrooms(df_slots, build_occupancy(df_courseline)).tolist()
+
+def add_time_slot():
+    """Append a default time slot (button callback)"""
+    st.session_state.time_slots.append({'weekday': 1, 'time': '19:00'})
+
+def remove_time_slot(idx):
+    """
+    Remove time slot idx (button callback)
+    The pickers of the following slots are re-created from time_slots at their new positions.
+    """
+    st.session_state.time_slots.pop(idx)
+    for key_idx in range(idx, len(st.session_state.time_slots) + 1):
+        st.session_state.pop(f"weekday_{key_idx}", None)
+        st.session_state.pop(f"time_{key_idx}", None)
+
+@st.fragment
+def schedule_times_picker(availability):
+    """
+    Time slot, start date and length pickers with the teachers / classrooms free at each slot
+    Runs as a fragment: changing a picker only reruns this section, and the suggestions always match the current inputs.
+    The chosen values are read back from session state when the form is submitted.
+    """
+    # Schedule times
+    st.write("**Schedule Times *")
+    hour_options = [f"{h:02d}:00" for h in range(24)]
+    
+    start_date = st.date_input(
+        "Start Date *",
+        value=datetime.now().date(),
+        key="courseline_start_date"
+    )
+    
+    weeks = st.selectbox(
+        "Generate Schedule for (weeks) *",
+        options=list(range(1, 53)),
+        index=11,
+        key="courseline_weeks"
+    )
     
-    # Check how many courses at the same time
-    same_time_courses = df_courseline[
-        (df_courseline['Weekday'] == weekday) & 
-        (df_courseline['Time'] == time)
-    ]
+    time_slots = []
+    for idx in range(len(st.session_state.time_slots)):
+        slot = st.session_state.time_slots[idx]
+        col1, col2, col3 = st.columns([2, 2, 1])
+        
+        with col1:
+            weekday_val = st.selectbox(
+                f"Weekday {idx+1}",
+                options=[("Mon", 1), ("Tue", 2), ("Wed", 3), ("Thu", 4), ("Fri", 5), ("Sat", 6), ("Sun", 7)],
+                format_func=lambda x: x[0],
+                index=slot['weekday']-1,
+                key=f"weekday_{idx}"
+            )[1]
+        
+        with col2:
+            time_val = st.selectbox(
+                f"Time {idx+1}",
+                options=hour_options,
+                index=hour_options.index(slot['time']) if slot['time'] in hour_options else 19,
+                key=f"time_{idx}"
+            )
+        
+        with col3:
+            if idx > 0:
+                st.button("🗑️", key=f"remove_{idx}", on_click=remove_time_slot, args=(idx,))
+        
+        time_slots.append({'weekday': weekday_val, 'time': time_val})
+        
+        # Suggest teachers / rooms free at this slot for the whole schedule period
+        if availability is not None:
+            free = free_resources(availability, weekday_val, time_val, start_date, weeks)
+            st.caption(
+                f"Free teachers: {', '.join(free['teachers']) or '-'} | "
+                f"Free classrooms: {', '.join(free['classrooms'])}"
+            )
     
-    # Calculate number of used classrooms
-    count = len(same_time_courses)
+    st.session_state.time_slots = time_slots
     
-    # Assign next classroom (A, B, C, D...)
-    classroom_letter = chr(65 + count)  # 65 = 'A'
+    if len(st.session_state.time_slots) < 7:
+        col_add1, col_add2, col_add3 = st.columns([1, 1, 1])
+        with col_add2:
+            st.button("Add Time Slot", use_container_width=True, on_click=add_time_slot)
     
-    return classroom_letter
+    st.markdown("---")
 
 def show_create_courseline_dialog():
     """
@@ -68,10 +146,17 @@ def show_create_courseline_dialog():
     """
     st.subheader("Add Course Line")
     
-    # Load base data
-    df_syllabus = load_config_syllabus()
-    df_teacher = load_config_teacher()
-    df_courseline = load_config_courseline()
+    # Load base data (single batched request)
+    sheets = load_all_sheets()
+    if sheets is None:
+        st.error("Unable to load data from Google Sheets")
+        return
+    
+    df_syllabus = sheets['Config_Syllabus']
+    df_teacher = sheets['Config_Teacher']
+    df_courseline = sheets['Config_CourseLine']
+    syllabus_index = load_syllabus_index()
+    availability = load_availability()
     
     if df_syllabus is None or len(df_syllabus) == 0:
         st.error("Please create syllabus in Config_Syllabus first")
@@ -98,6 +183,9 @@ def show_create_courseline_dialog():
     if 'time_slots' not in st.session_state:
         st.session_state.time_slots = [{'weekday': 1, 'time': '19:00'}]
     
+    # Time slots, start date and length live outside the form so the free teacher / room suggestions follow every change
+    schedule_times_picker(availability)
+    
     # Form
     with st.form("create_courseline_form"):
         # Course name
@@ -115,7 +203,7 @@ def show_create_courseline_dialog():
         
         # Display syllabus content
         with st.expander("View Syllabus Content"):
-            syllabus_detail = df_syllabus[df_syllabus['SyllabusID'] == syllabus_id]
+            syllabus_detail = syllabus_books(syllabus_index, syllabus_id)
             display_columns = ['Sequence', 'Book_Full_Name']
             if 'Unit' in syllabus_detail.columns:
                 display_columns.append('Unit')
@@ -130,53 +218,6 @@ def show_create_courseline_dialog():
             
             st.dataframe(display_df, width='stretch', hide_index=True)
         
-        st.markdown("---")
-        
-        # Schedule times
-        st.write("**Schedule Times *")
-        hour_options = [f"{h:02d}:00" for h in range(24)]
-        
-        time_slots = []
-        for idx in range(len(st.session_state.time_slots)):
-            slot = st.session_state.time_slots[idx]
-            col1, col2, col3 = st.columns([2, 2, 1])
-            
-            with col1:
-                weekday_val = st.selectbox(
-                    f"Weekday {idx+1}",
-                    options=[("Mon", 1), ("Tue", 2), ("Wed", 3), ("Thu", 4), ("Fri", 5), ("Sat", 6), ("Sun", 7)],
-                    format_func=lambda x: x[0],
-                    index=slot['weekday']-1,
-                    key=f"weekday_{idx}"
-                )[1]
-            
-            with col2:
-                time_val = st.selectbox(
-                    f"Time {idx+1}",
-                    options=hour_options,
-                    index=hour_options.index(slot['time']) if slot['time'] in hour_options else 19,
-                    key=f"time_{idx}"
-                )
-            
-            with col3:
-                if idx > 0:
-                    if st.form_submit_button("🗑️", key=f"remove_{idx}"):
-                        st.session_state.time_slots.pop(idx)
-                        st.rerun()
-            
-            time_slots.append({'weekday': weekday_val, 'time': time_val})
-        
-        st.session_state.time_slots = time_slots
-        
-        if len(st.session_state.time_slots) < 7:
-            col_add1, col_add2, col_add3 = st.columns([1, 1, 1])
-            with col_add2:
-                if st.form_submit_button("Add Time Slot", use_container_width=True):
-                    st.session_state.time_slots.append({'weekday': 1, 'time': '19:00'})
-                    st.rerun()
-        
-        st.markdown("---")
-        
         # Select teacher
         selected_teacher_key = st.selectbox(
             "Select Teacher *",
@@ -184,19 +225,6 @@ def show_create_courseline_dialog():
         )
         teacher_id = teacher_options[selected_teacher_key]
         
-        # Start date
-        start_date = st.date_input(
-            "Start Date *",
-            value=datetime.now().date()
-        )
-        
-        # Number of weeks
-        weeks = st.selectbox(
-            "Generate Schedule for (weeks) *",
-            options=list(range(1, 53)),
-            index=11
-        )
-        
         note = st.text_area("Note", placeholder="Optional", height=80)
         
         col_submit1, col_submit2, col_submit3 = st.columns([1, 1, 1])
@@ -204,23 +232,33 @@ def show_create_courseline_dialog():
             submitted = st.form_submit_button("Create Course Line", use_container_width=True, type="primary")
         
         if submitted:
+            time_slots = st.session_state.time_slots
+            start_date = st.session_state.courseline_start_date
+            weeks = st.session_state.courseline_weeks
+            
             if not course_name:
                 st.error("Please enter course name")
                 return
             
+            # A repeated weekday + time would produce the same Slot_ID for two lessons
+            slot_keys = [(slot['weekday'], slot['time']) for slot in time_slots]
+            if len(set(slot_keys)) < len(slot_keys):
+                st.error("Each time slot must have a different weekday or time")
+                return
+            
             # Generate CourseLineID (shared by all time slots)
             courseline_id = generate_courseline_id(df_courseline)
             
             with st.spinner("Creating course line..."):
                 all_success = True
                 created_configs = [] # [新增] 收集所有建立的設定檔
+                classrooms = auto_assign_classrooms(df_courseline, time_slots)
                 
                 # 1. 先將所有時段寫入 Config_CourseLine
                 for idx, slot in enumerate(time_slots):
                     weekday = slot['weekday']
                     time = slot['time']
-                    
-                    classroom = auto_assign_classroom(df_courseline, weekday, time)
+                    classroom = classrooms[idx]
                     
                     courseline_data = {
                         'CourseLineID': courseline_id,
@@ -248,10 +286,19 @@ def show_create_courseline_dialog():
                     schedule = generate_interleaved_schedule(
                         created_configs, 
                         df_syllabus, 
-                        weeks=weeks
+                        weeks=weeks,
+                        syllabus_index=syllabus_index
                     )
                     
                     if len(schedule) > 0:
+                        # Warn about double bookings against the existing schedule
+                        conflicts = find_conflicts(
+                            pd.concat([sheets['Master_Schedule'], schedule], ignore_index=True),
+                            involving=schedule['Slot_ID']
+                        )
+                        if len(conflicts) > 0:
+                            st.warning(f"⚠️ {len(conflicts)} teacher / classroom double bookings with existing courses, see the Scheduling Conflicts report")
+                        
                         from sheets_handler import append_master_schedule
                         write_success = append_master_schedule(schedule)
                         
@@ -0,0 +1,165 @@
+"""
+虛擬排程模組
+不需要 Master_Schedule 的列，直接由 Config_CourseLine 以公式算出任一天的課程：
+- 時段在日期 D 有課 ⇔ D 不早於第一次上課日，且相差天數為 7 的倍數
+- 該堂課在路線中的序號 = 同一路線所有時段在 (D, 時間) 之前的堂數
+- 教材位置 = 課綱起點 + (開始序列 - 1 + 序號) mod 教材數（與 build_schedule 相同）
+每次查詢為 O(時段數)；Master_Schedule 中明確存在的列（以 Slot_ID 對應）優先於計算結果
+"""
+
+import numpy as np
+import pandas as pd
+
+from schedule_generator import assemble_schedule, prepare_courselines, resolve_lines
+
+def build_virtual_schedule(df_courseline, syllabus_index, weeks=None):
+    """
+    建立虛擬排程（每次載入設定只需建立一次）
+
+    Parameters:
+    - df_courseline: Config_CourseLine（只使用進行中的路線）
+    - syllabus_index: build_syllabus_index 的結果
+    - weeks: 每個時段最多幾週（None 表示持續進行、不設上限）
+
+    Returns:
+    - dict，供 lessons_on / lessons_between / book_on 使用
+    """
+    configs, line_of_config = prepare_courselines(df_courseline)
+    lines = resolve_lines(configs, line_of_config, syllabus_index) if len(configs) > 0 else None
+
+    virtual = {'lines': lines, 'syllabus_index': syllabus_index, 'weeks': weeks}
+    if lines is not None:
+        virtual['time_keys'] = lines['configs']['Time'].astype(str).to_numpy(dtype=object)
+        virtual['line_ids'] = lines['base']['CourseLineID'].astype(str).to_numpy(dtype=object)
+    return virtual
+
+def lesson_positions(virtual, date):
+    """
+    計算日期 date 當天有課的時段，以及每堂課在所屬路線中的序號
+
+    Returns:
+    - (時段編號, 序號)，依時間、路線順序排列（與 build_schedule 的排序相同）
+    """
+    lines = virtual['lines']
+    date = np.datetime64(pd.Timestamp(date).date(), 'D')
+    elapsed = (date - lines['first_dates']).astype(np.int64)
+
+    # 每個時段在 date 之前已上的堂數，以及 date 當天是否有課
+    before = np.where(elapsed > 0, (elapsed + 6) // 7, 0)
+    on_date = (elapsed >= 0) & (elapsed % 7 == 0)
+    if virtual['weeks'] is not None:
+        before = np.minimum(before, virtual['weeks'])
+        on_date &= elapsed // 7 < virtual['weeks']
+
+    config_line = lines['config_line']
+    line_count = len(lines['base'])
+    before_line = np.bincount(config_line, weights=before, minlength=line_count).astype(np.int64)
+
+    # 同一路線同一天有多個時段時，依時間（再依時段順序）排在後面的序號較大
+    todays = np.flatnonzero(on_date)
+    order = np.lexsort((todays, virtual['time_keys'][todays], config_line[todays]))
+    todays = todays[order]
+    todays_line = config_line[todays]
+    rank = np.arange(len(todays)) - np.searchsorted(todays_line, todays_line, side='left')
+    ordinals = before_line[todays_line] + rank
+
+    # 輸出依時間排序，同時段依路線順序
+    final = np.lexsort((todays_line, virtual['time_keys'][todays]))
+    return todays[final], ordinals[final]
+
+def book_positions(virtual, slot_line, ordinals):
+    """
+    每堂課的教材位置（與 build_schedule 相同的公式）
+    """
+    lines = virtual['lines']
+    return (
+        lines['book_start'][slot_line]
+        + (lines['start_sequence'][slot_line] - 1 + ordinals) % lines['book_count'][slot_line]
+    )
+
+def apply_overrides(schedule, overrides, dates):
+    """
+    以 Master_Schedule 中明確存在的列取代計算結果（以 Slot_ID 對應），
+    並加入只存在於 Master_Schedule 的課程（例如補課）
+    """
+    if overrides is None or overrides.empty:
+        return schedule
+
+    override_dates = pd.to_datetime(overrides['Date'], errors='coerce').dt.strftime('%Y-%m-%d')
+    in_range = override_dates.isin(dates).to_numpy()
+    explicit = overrides[in_range].copy()
+    if explicit.empty:
+        return schedule
+
+    explicit['Date'] = override_dates[in_range].to_numpy()
+    computed = schedule[~schedule['Slot_ID'].isin(explicit['Slot_ID'].astype(str))]
+    merged = pd.concat([computed, explicit[[col for col in explicit.columns if col in schedule.columns]]], ignore_index=True)
+    return merged.sort_values(['Date', 'Time'], kind='stable').reset_index(drop=True)
+
+def lessons_on(virtual, date, overrides=None):
+    """
+    日期 date 當天的所有課程（Master_Schedule 格式，不含 Created_At / Updated_At）
+    overrides: Master_Schedule（或其中的例外列），明確存在的列優先
+    """
+    return lessons_between(virtual, date, date, overrides)
+
+def lessons_between(virtual, start_date, end_date, overrides=None):
+    """
+    start_date 到 end_date（含）之間的所有課程，每天各計算一次
+    """
+    days = pd.date_range(pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize(), freq='D')
+    dates = [day.strftime('%Y-%m-%d') for day in days]
+
+    if virtual['lines'] is None or len(days) == 0:
+        schedule = pd.DataFrame(columns=['Slot_ID', 'Date', 'Time'])
+    else:
+        slot_config, slot_line, book_pos, class_dates = [], [], [], []
+        for day in days:
+            configs_today, ordinals = lesson_positions(virtual, day)
+            lines_today = virtual['lines']['config_line'][configs_today]
+            slot_config.append(configs_today)
+            slot_line.append(lines_today)
+            book_pos.append(book_positions(virtual, lines_today, ordinals))
+            class_dates.append(np.full(len(configs_today), np.datetime64(day.date(), 'D')))
+
+        schedule = assemble_schedule(
+            virtual['lines'],
+            virtual['syllabus_index'],
+            np.concatenate(slot_config),
+            np.concatenate(slot_line),
+            np.concatenate(book_pos),
+            np.concatenate(class_dates).astype('datetime64[D]'),
+        ).drop(columns=['Created_At', 'Updated_At'])
+
+    return apply_overrides(schedule, overrides, dates)
+
+def book_on(virtual, courseline_id, date, overrides=None):
+    """
+    課綱路線在日期 date 上的教材：當天有課時為當天的課，否則為 date 之前最後一堂課
+    返回該堂課（Series），尚未開課或找不到路線時返回 None
+    """
+    if virtual['lines'] is None:
+        return None
+
+    matches = np.flatnonzero(virtual['line_ids'] == str(courseline_id))
+    if len(matches) == 0:
+        return None
+    line = matches[0]
+
+    # 該路線最近一次上課的日期：各時段在 date 當天或之前的最後一次上課
+    lines = virtual['lines']
+    in_line = np.flatnonzero(lines['config_line'] == line)
+    date = np.datetime64(pd.Timestamp(date).date(), 'D')
+    elapsed = (date - lines['first_dates'][in_line]).astype(np.int64)
+    if virtual['weeks'] is not None:
+        elapsed = np.minimum(elapsed, (virtual['weeks'] - 1) * 7)
+    started = elapsed >= 0
+    if not started.any():
+        return None
+    last_date = (lines['first_dates'][in_line] + (elapsed - elapsed % 7).astype('timedelta64[D]'))[started].max()
+
+    day = lessons_on(virtual, last_date, overrides)
+    day = day[day['CourseLineID'].astype(str) == str(courseline_id)]
+    if day.empty:
+        return None
+    return day.iloc[-1]